@@ -1,22 +1,28 @@
+import contextlib
 import functools
+import heapq
+import inspect
 import os
+import sys
 import threading
 import time
+import traceback
+from array import array
 from collections import defaultdict
-
-from concurrent.futures.thread import ThreadPoolExecutor
 from typing import Tuple, Optional
 
 import pytest
 from _pytest.fixtures import FixtureDef, SubRequest, FixtureRequest
 from _pytest.nodes import Item
 from _pytest.python import Function
-from _pytest.runner import SetupState, _update_current_test_var
-
-from loguru import logger
+from _pytest.reports import TestReport
+from _pytest.runner import CallInfo, SetupState, _update_current_test_var, call_and_report, runtestprotocol
 
-logger.remove(handler_id=None)
-logger.add("dispatch-case.log")
+from .autoscale import ThreadAutoscaler, parse_thread_range
+from .failfast import skipped_report
+from .log import logger, LEVELS
+from .parallel import is_free_threaded_build, is_gil_enabled
+from .worker import WorkerPool, GroupWorker, is_worker, parse_address
 
 # 指定case分组的单元的mark标签字符
 CASE_GROUP_UNIT_TAG = "group-unit"
@@ -28,10 +34,55 @@ THREAD_COUNT = "thread"
 NOTCONCURRENT = "notconcurrent"
 # 资源占用互斥marker
 RESOURCE = "resource"
+# 任务调度策略
+GROUP_SCHEDULE = "group-schedule"
+# 缓存case运行耗时的key，位于.pytest_cache中
+DURATIONS_CACHE_KEY = "pytest-groups/durations"
+# case的执行模式
+GROUP_WORKERS = "group-workers"
+# 启动的worker进程数量
+PROCESS_COUNT = "process"
+# hybrid执行模式下，声明case在worker进程中运行的marker
+PROCESS_LANE = "process"
+# 事件循环中同时运行的协程case数量
+ASYNC_CONCURRENCY = "async-concurrency"
+# 调度时间线的输出路径
+GROUP_TRACE = "group-trace"
+# 同时打开(fixture已执行且未卸载)的module/class作用域的最大数量
+MAX_OPEN_SCOPES = "max-open-scopes"
+# 调度日志的路径、级别、格式
+GROUP_LOG = "group-log"
+GROUP_LOG_LEVEL = "group-log-level"
+GROUP_LOG_FORMAT = "group-log-format"
+# 自动伸缩线程池时进程cpu使用率的上限
+THREAD_CPU_LIMIT = "thread-cpu-limit"
+# 多节点执行：调度进程监听的地址、等待连接的其他节点worker进程数量、worker进程连接的调度进程地址、连接认证的密钥
+GROUP_LISTEN = "group-listen"
+GROUP_REMOTE_WORKERS = "group-remote-workers"
+GROUP_CONNECT = "group-connect"
+GROUP_AUTHKEY = "group-authkey"
+# 一次分配给一个worker进程的同一分组内连续case的最大数量
+GROUP_LEASE = "group-lease"
+# 运行结束时输出调度状态占用的内存
+GROUP_MEMORY_REPORT = "group-memory-report"
+# 缓存分组规划，只重新规划发生变化的文件中的case
+GROUP_PLAN_CACHE = "group-plan-cache"
+# case失败时跳过所在分组的后续case(group)，或停止调度全部case(session)
+GROUP_FAILFAST = "group-failfast"
+# case运行的超时时间，以及为case单独声明超时时间的marker
+GROUP_TIMEOUT = "group-timeout"
+GROUP_TIMEOUT_MARKER = "group_timeout"
+# 报告的输出顺序
+GROUP_REPORT_ORDER = "group-report-order"
+# 将case拆分到多个CI任务时，当前任务运行的分片
+GROUP_SHARD = "group-shard"
+# pytest记录当前运行的case及阶段的环境变量，多线程运行时按线程隔离
+CURRENT_TEST_VAR = "PYTEST_CURRENT_TEST"
 
 
 def pytest_addoption(parser):
-    thread_help = "线程数量，每个线程都会用于启动一个分组，默认值：1"
+    thread_help = "线程数量，每个线程都会用于启动一个分组，默认值：1；" \
+                  "取值为auto或min:max时，根据case等待IO的时间占比和待执行任务的积压情况自动伸缩线程数量"
 
     # pytest -h 中添加命令帮助信息
     group = parser.getgroup('pytest-groups')
@@ -51,14 +102,154 @@ def pytest_addoption(parser):
     parser.addini(CASE_GROUP_UNIT_TAG, type="args", default="module", help=group_unit_help)
     # parser.addini('group-unit', type="args", default="function", help=group_unit_help)
 
-
+    group_schedule_help = "任务调度策略，可选值：collection(默认值，按照case的收集顺序调度)/" \
+                          "critical-path(根据上次运行记录的耗时，优先调度剩余关键路径最长的分组)"
+    group.addoption(f"--{GROUP_SCHEDULE}", action="store", default=None,
+                    choices=("collection", "critical-path"), help=group_schedule_help)
+    parser.addini(GROUP_SCHEDULE, type="args", default=["collection"], help=group_schedule_help)
+
+    group_workers_help = "case的执行模式，可选值：thread(默认值，在线程池中运行)/process(在worker进程中运行)/" \
+                         "hybrid(@pytest.mark.process标注的case在worker进程中运行，其余case在线程池中运行)"
+    group.addoption(f"--{GROUP_WORKERS}", action="store", default=None,
+                    choices=("thread", "process", "hybrid"), help=group_workers_help)
+    parser.addini(GROUP_WORKERS, type="args", default=["thread"], help=group_workers_help)
+
+    process_help = "worker进程数量，执行模式为process/hybrid时生效，默认值：cpu核数"
+    group.addoption(f"--{PROCESS_COUNT}", action="store", default=None, help=process_help)
+    parser.addini(PROCESS_COUNT, type="args", default=[], help=process_help)
+
+    async_concurrency_help = "事件循环中同时运行的协程(async def)case数量，大于0时协程case在共享的事件循环中运行，" \
+                             "不占用--thread的线程，默认值：0(不启用)"
+    group.addoption(f"--{ASYNC_CONCURRENCY}", action="store", default=None, help=async_concurrency_help)
+    parser.addini(ASYNC_CONCURRENCY, type="args", default=[], help=async_concurrency_help)
+
+    group_trace_help = "记录调度、fixture、case运行的时间线，以Chrome trace格式输出到指定的json文件，" \
+                       "并在运行结束时输出线程池利用率和主要的阻塞分组/资源，默认不记录"
+    group.addoption(f"--{GROUP_TRACE}", action="store", default=None, help=group_trace_help)
+    parser.addini(GROUP_TRACE, type="args", default=[], help=group_trace_help)
+
+    max_open_scopes_help = "同时打开(fixture已执行且未卸载)的module/class作用域的最大数量，" \
+                           "大于0时优先调度所在作用域已经打开的case，默认值：0(不限制)"
+    group.addoption(f"--{MAX_OPEN_SCOPES}", action="store", default=None, help=max_open_scopes_help)
+    parser.addini(MAX_OPEN_SCOPES, type="args", default=[], help=max_open_scopes_help)
+
+    group_log_help = "调度日志的文件路径，日志由后台线程批量写入，默认不记录"
+    group.addoption(f"--{GROUP_LOG}", action="store", default=None, help=group_log_help)
+    parser.addini(GROUP_LOG, type="args", default=[], help=group_log_help)
+
+    group_log_level_help = "调度日志的级别，可选值：debug/info(默认值)/warning/error"
+    group.addoption(f"--{GROUP_LOG_LEVEL}", action="store", default=None,
+                    choices=tuple(LEVELS), help=group_log_level_help)
+    parser.addini(GROUP_LOG_LEVEL, type="args", default=["info"], help=group_log_level_help)
+
+    group_log_format_help = "调度日志的格式，可选值：text(默认值)/json(每行一个json对象)"
+    group.addoption(f"--{GROUP_LOG_FORMAT}", action="store", default=None,
+                    choices=("text", "json"), help=group_log_format_help)
+    parser.addini(GROUP_LOG_FORMAT, type="args", default=["text"], help=group_log_format_help)
+
+    thread_cpu_limit_help = "自动伸缩线程数量时，进程cpu使用率(占全部cpu核的百分比)的上限，超过时减少线程数量，默认不限制"
+    group.addoption(f"--{THREAD_CPU_LIMIT}", action="store", default=None, help=thread_cpu_limit_help)
+    parser.addini(THREAD_CPU_LIMIT, type="args", default=[], help=thread_cpu_limit_help)
+
+    group_listen_help = "调度进程监听的地址(host:port)，其他节点上的worker进程通过--group-connect连接到该地址，" \
+                        "设置后执行模式默认为process"
+    group.addoption(f"--{GROUP_LISTEN}", action="store", default=None, help=group_listen_help)
+    parser.addini(GROUP_LISTEN, type="args", default=[], help=group_listen_help)
+
+    group_remote_workers_help = "调度进程需要等待连接的其他节点上的worker进程数量，默认值：0"
+    group.addoption(f"--{GROUP_REMOTE_WORKERS}", action="store", default=None, help=group_remote_workers_help)
+    parser.addini(GROUP_REMOTE_WORKERS, type="args", default=[], help=group_remote_workers_help)
+
+    group_connect_help = "以worker进程的方式启动，连接到指定地址(host:port)的调度进程，运行调度进程分配的case"
+    group.addoption(f"--{GROUP_CONNECT}", action="store", default=None, help=group_connect_help)
+
+    group_authkey_help = "调度进程与其他节点上的worker进程之间连接认证的密钥，也可以通过环境变量PYTEST_GROUPS_AUTHKEY指定"
+    group.addoption(f"--{GROUP_AUTHKEY}", action="store", default=None, help=group_authkey_help)
+
+    group_lease_help = "一次分配给一个worker进程按顺序运行的同一分组内连续case的最大数量，默认值：8"
+    group.addoption(f"--{GROUP_LEASE}", action="store", default=None, help=group_lease_help)
+    parser.addini(GROUP_LEASE, type="args", default=[], help=group_lease_help)
+
+    group_memory_report_help = "运行结束时输出调度状态各部分占用的内存，以及与按case对象建立dict/set的存储方式的对比"
+    group.addoption(f"--{GROUP_MEMORY_REPORT}", action="store_true", default=False, help=group_memory_report_help)
+
+    group_plan_cache_help = "将case的分组规划缓存在.pytest_cache中，下次运行时只重新规划发生变化的文件中的case；" \
+                            "conftest.py、配置文件或分组单元变化时缓存全部失效"
+    group.addoption(f"--{GROUP_PLAN_CACHE}", action="store_true", default=False, help=group_plan_cache_help)
+
+    group_failfast_help = "case失败时的处理，可选值：group(跳过失败case所在分组中还未运行的case)/" \
+                          "session(停止调度新的case，等待正在运行的case完成后结束)，默认不处理"
+    group.addoption(f"--{GROUP_FAILFAST}", action="store", default=None, choices=("group", "session"),
+                    help=group_failfast_help)
+    parser.addini(GROUP_FAILFAST, type="args", default=[], help=group_failfast_help)
+
+    group_timeout_help = "线程池中case运行(setup+call+teardown)的超时时间(秒)，超时的case报告为失败并输出线程堆栈，" \
+                         "释放其占用的分组、资源和作用域，并补充一个线程继续运行其他case，默认不限制"
+    group.addoption(f"--{GROUP_TIMEOUT}", action="store", default=None, help=group_timeout_help)
+    parser.addini(GROUP_TIMEOUT, type="args", default=[], help=group_timeout_help)
+
+    group_report_order_help = "多个线程、worker进程同时运行case时报告的输出顺序，可选值：completion(默认值，按照case运行完成的顺序)/" \
+                              "group(同一分组的case全部完成后集中输出)"
+    group.addoption(f"--{GROUP_REPORT_ORDER}", action="store", default=None, choices=("completion", "group"),
+                    help=group_report_order_help)
+    parser.addini(GROUP_REPORT_ORDER, type="args", default=[], help=group_report_order_help)
+
+    group_shard_help = "将case拆分到n个独立运行的任务中，当前任务只运行第i个分片，格式为i/n(i从1开始)；" \
+                       "互相重叠的分组、notconcurrent的case总是分配到同一个分片，按照历史耗时(没有时按照case数量)均衡"
+    group.addoption(f"--{GROUP_SHARD}", action="store", default=None, help=group_shard_help)
+    parser.addini(GROUP_SHARD, type="args", default=[], help=group_shard_help)
+
+
+@pytest.mark.tryfirst
 def pytest_configure(config):
+    log_path = parse_config(config, GROUP_LOG)
+    if log_path:
+        if is_worker():
+            # worker进程各自写入单独的日志文件
+            log_path = f"{log_path}.{os.getpid()}"
+        logger.configure(log_path, parse_config(config, GROUP_LOG_LEVEL), parse_config(config, GROUP_LOG_FORMAT))
+
+    # --group-connect只能通过命令参数指定
+    connect = config.getoption(f"--{GROUP_CONNECT}")
+    if is_worker() or connect:
+        # worker进程只负责运行调度进程分配的case，报告由调度进程统一输出
+        config.option.xmlpath = None
+        failfast = parse_config(config, GROUP_FAILFAST)
+        if connect:
+            authkey = get_authkey(config)
+            if not authkey:
+                raise pytest.UsageError(f"--{GROUP_CONNECT}连接其他节点的调度进程时必须通过--{GROUP_AUTHKEY}指定连接认证的密钥")
+            worker = GroupWorker(config, parse_address(connect), authkey, failfast)
+        else:
+            worker = GroupWorker(config, failfast=failfast)
+        config.pluginmanager.register(worker, f"{CASE_GROUP_TAG}-worker")
+        return
+
     thread_count = parse_config(config, THREAD_COUNT)
     # 如果有配置插件相关参数（thread等），才启用插件,默认启用
     if not config.option.collectonly and thread_count:
         config.pluginmanager.register(GroupRunner(config), CASE_GROUP_TAG)
 
 
+def get_authkey(config) -> Optional[bytes]:
+    """
+    多节点执行时连接认证的密钥，依次从命令参数、环境变量中读取，密钥不写在配置文件中
+    """
+    authkey = config.getoption(f"--{GROUP_AUTHKEY}") or os.environ.get("PYTEST_GROUPS_AUTHKEY")
+    return authkey.encode() if authkey else None
+
+
+def pytest_unconfigure(config):
+    # 写入剩余的日志
+    logger.close()
+
+
+class AbandonedItemError(Exception):
+    """
+    超时被放弃的case所在线程恢复运行后，用于中止这个case的后续阶段
+    """
+
+
 class ThreadLocalSetupState(SetupState, threading.local):
     def __init__(self):
         super(ThreadLocalSetupState, self).__init__()
@@ -69,61 +260,83 @@ class ThreadLocalFixtureDef(FixtureDef, threading.local):
         super(ThreadLocalFixtureDef, self).__init__(*args, **kwargs)
 
 
+class CurrentTestStore(threading.local):
+    """
+    线程中PYTEST_CURRENT_TEST的值，没有设置时为None，读取时不需要处理AttributeError
+    """
+    value = None
+
+
 class ThreadLocalEnviron(os._Environ):
+    """
+    按线程隔离PYTEST_CURRENT_TEST的os.environ
+
+    多个线程同时运行case时，每个线程只能看到自己正在运行的case；PYTEST_CURRENT_TEST只保存在线程中，不再写入进程的环境变量，
+    避免多个线程同时调用putenv，子进程需要通过显式传入的env(如dict(os.environ))获取。
+    其他key直接读写os._Environ共享的_data，只多一次key的比较，不调用super()
+    """
+
     def __init__(self, env):
-        super().__init__(
-            env._data,
-            env.encodekey,
-            env.decodekey,
-            env.encodevalue,
-            env.decodevalue,
-            env.putenv,
-            env.unsetenv
-        )
-        if hasattr(env, 'thread_store'):
-            self.thread_store = env.thread_store
-        else:
-            self.thread_store = threading.local()
+        args = [env._data, env.encodekey, env.decodekey, env.encodevalue, env.decodevalue]
+        if hasattr(env, "putenv"):
+            # python3.8及以下版本的os._Environ需要传入putenv、unsetenv
+            args += [env.putenv, env.unsetenv]
+        super().__init__(*args)
+        self.thread_store = getattr(env, "thread_store", None) or CurrentTestStore()
 
     def __getitem__(self, key):
-        if key == 'PYTEST_CURRENT_TEST':
-            if hasattr(self.thread_store, key):
-                value = getattr(self.thread_store, key)
-                return self.decodevalue(value)
-            else:
-                raise KeyError(key) from None
-        return super().__getitem__(key)
+        if key == CURRENT_TEST_VAR:
+            value = self.thread_store.value
+            if value is None:
+                raise KeyError(key)
+            return value
+        try:
+            value = self._data[self.encodekey(key)]
+        except KeyError:
+            raise KeyError(key) from None
+        return self.decodevalue(value)
 
     def __setitem__(self, key, value):
-        if key == 'PYTEST_CURRENT_TEST':
-            value = self.encodevalue(value)
-            self.putenv(self.encodekey(key), value)
-            setattr(self.thread_store, key, value)
-        else:
-            super().__setitem__(key, value)
+        if key == CURRENT_TEST_VAR:
+            # 与os.environ一致，只接受str
+            self.encodevalue(value)
+            self.thread_store.value = value
+            return
+        super().__setitem__(key, value)
 
     def __delitem__(self, key):
-        if key == 'PYTEST_CURRENT_TEST':
-            self.unsetenv(self.encodekey(key))
-            if hasattr(self.thread_store, key):
-                delattr(self.thread_store, key)
-            else:
-                raise KeyError(key) from None
-        else:
-            super().__delitem__(key)
+        if key == CURRENT_TEST_VAR:
+            if self.thread_store.value is None:
+                raise KeyError(key)
+            self.thread_store.value = None
+            return
+        super().__delitem__(key)
+
+    def __contains__(self, key):
+        if key == CURRENT_TEST_VAR:
+            return self.thread_store.value is not None
+        return self.encodekey(key) in self._data
+
+    def get(self, key, default=None):
+        if key == CURRENT_TEST_VAR:
+            value = self.thread_store.value
+            return default if value is None else value
+        try:
+            value = self._data[self.encodekey(key)]
+        except KeyError:
+            return default
+        return self.decodevalue(value)
 
     def __iter__(self):
-        if hasattr(self.thread_store, 'PYTEST_CURRENT_TEST'):
-            yield 'PYTEST_CURRENT_TEST'
-        keys = list(self._data)
-        for key in keys:
-            yield self.decodekey(key)
+        if self.thread_store.value is not None:
+            yield CURRENT_TEST_VAR
+        yield from super().__iter__()
 
     def __len__(self):
-        return len(self.thread_store.__dict__) + len(self._data)
+        return len(self._data) + (self.thread_store.value is not None)
 
     def copy(self):
-        return type(self)(self)
+        return dict(self)
 
 
 def parse_config(config, name):
@@ -191,31 +404,176 @@ def parse_config(config, name):
 class GroupRunner(object):
     def __init__(self, config):
         # 获取应该启动的线程数
-        self.thread_count = int(parse_config(config, THREAD_COUNT))
-        # case的分组结果
+        thread_min, self.thread_count = parse_thread_range(parse_config(config, THREAD_COUNT))
+        # 线程数量为范围时自动伸缩，self.thread_count为线程数量的上限
+        self.autoscaler = None
+        if thread_min != self.thread_count:
+            cpu_limit = parse_config(config, THREAD_CPU_LIMIT)
+            self.autoscaler = ThreadAutoscaler(thread_min, self.thread_count,
+                                               float(cpu_limit) if cpu_limit else None)
+        # 任务调度策略
+        self.schedule = parse_config(config, GROUP_SCHEDULE)
+        # case的执行模式，以及worker进程数量
+        self.workers_mode = parse_config(config, GROUP_WORKERS)
+        self.process_count = int(parse_config(config, PROCESS_COUNT) or os.cpu_count() or 1)
+        self.worker_pool = None
+        # 多节点执行时监听的地址、等待连接的其他节点worker进程数量
+        self.listen = parse_config(config, GROUP_LISTEN)
+        self.remote_workers = int(parse_config(config, GROUP_REMOTE_WORKERS) or 0)
+        self.authkey = get_authkey(config)
+        if self.listen and self.workers_mode in (None, "thread"):
+            self.workers_mode = "process"
+        if self.listen and self.remote_workers and parse_config(config, PROCESS_COUNT) is None:
+            # 有其他节点参与时，本机默认不再启动worker进程
+            self.process_count = 0
+        if self.listen and self.listen.rsplit(":", 1)[0] not in ("127.0.0.1", "localhost") and not self.authkey:
+            raise pytest.UsageError(f"--{GROUP_LISTEN}监听非本机地址时必须通过--{GROUP_AUTHKEY}指定连接认证的密钥")
+        if self.remote_workers and not self.authkey:
+            # 随机生成的密钥无法告知其他节点上的worker进程
+            raise pytest.UsageError(f"--{GROUP_REMOTE_WORKERS}大于0时必须通过--{GROUP_AUTHKEY}指定连接认证的密钥")
+        # 一次分配给worker进程的同一分组内连续case的最大数量；被分配但还未运行的case，以及运行完成后不释放worker的case
+        self.lease_size = int(parse_config(config, GROUP_LEASE) or 8)
+        self.leased = set()
+        self.lane_release = {}
+        # 已经调度的任务数量
+        self.dispatch_count = 0
+        # 在worker进程中运行的case
+        self.process_items = set()
+        # 事件循环中同时运行的协程case数量，以及在事件循环中运行的case
+        self.async_concurrency = int(parse_config(config, ASYNC_CONCURRENCY) or 0)
+        self.async_items = set()
+        self.loop = None
+        # 协程fixture的执行结果，同一个协程对象只会被await一次
+        self.async_fixture_results = {}
+        # 调度时间线记录，未开启时为None
+        trace_path = parse_config(config, GROUP_TRACE)
+        self.tracer = None
+        if trace_path:
+            from .trace import GroupTracer
+            self.tracer = GroupTracer(trace_path)
+        # 同时打开的module/class作用域的最大数量，大于0时按照作用域的局部性调度
+        self.max_open_scopes = int(parse_config(config, MAX_OPEN_SCOPES) or 0)
+        # case所在的module/class作用域(按照case编号存储)，作用域下未完成的case数量，已经打开的作用域
+        self.item_scopes = []
+        self.scope_remaining = defaultdict(int)
+        self.open_scopes = set()
+        # 所在作用域都已经打开的就绪任务，优先调度；以及作用域打开前进入就绪队列的任务
+        self.local_ready = []
+        self.scope_ready_items = defaultdict(list)
+        # 已经调度的任务(按照case编号存储的标记)，同一个任务可能同时在两个就绪队列中，出队时跳过已经调度的任务
+        self.dispatched = bytearray()
+        # 任务被调度的时间，以及最近一次无法调度任务的原因，仅在记录时间线时使用
+        self.task_started = {}
+        self.blocked_reasons = ()
+        # 线程池、worker进程池各自正在运行的任务数量和容量
+        self.lane_capacity = {}
+        if self.workers_mode in (None, "thread", "hybrid"):
+            self.lane_capacity["thread"] = self.autoscaler.capacity if self.autoscaler else self.thread_count
+        if self.workers_mode in ("process", "hybrid"):
+            self.lane_capacity["process"] = self.process_count + self.remote_workers
+        if self.async_concurrency > 0:
+            self.lane_capacity["async"] = self.async_concurrency
+        self.lane_running = dict.fromkeys(self.lane_capacity, 0)
+        # 本次运行记录的case耗时，nodeid -> 秒
+        self.durations = defaultdict(float)
+        # case的分组结果，构建分组索引后释放
         self.item_dict = {}
-        self.item_map_exist = {}
-        self.lock = threading.Lock()
-        self.tasks = []
+        # case按照收集顺序编号，以下调度状态都按照编号存储在array中，避免大量case时每个case各自一个dict、list的内存开销
+        self.items = []
+        self.item_index = {}
+        # 分组索引：
+        # group_members[group_start[gid]:group_start[gid + 1]]为分组内按顺序排列的case编号，
+        # item_group_ids、item_group_slots的[item_group_start[i]:item_group_start[i + 1]]为case所属的分组及其在group_members中的下标，
+        # group_cursor为每个分组下一个允许运行的case在group_members中的下标
+        self.group_keys = []
+        self.group_start = array("l", [0])
+        self.group_members = array("l")
+        self.item_group_start = array("l", [0])
+        self.item_group_ids = array("l")
+        self.item_group_slots = array("l")
+        self.group_cursor = array("l")
+        # case还需要等待的分组数量，为0时进入就绪队列
+        self.item_waiting = array("l")
+        # 就绪队列中case的排序依据，与case编号组成(优先级, 编号)，相同优先级时按照收集顺序出队
+        self.item_priority = array("d")
+        # 就绪队列
+        self.ready = []
+        # 不接受并发的case的标记
+        self.notconcurrent = bytearray()
+        # 调度状态(分组索引、就绪队列、正在运行的任务、资源、作用域计数、超时记录等)只在持有self.lock时读写，不依赖GIL保证单个操作的原子性；
+        # 只有调度线程读写的状态(task_order、task_index、dispatch_count)，以及发布后不再修改的fixture执行结果快照除外
+        self.lock = threading.RLock()
+        # 任务完成、任务被调度时发出通知，调度线程据此重新检查是否有可运行的任务，替代轮询等待
+        self.condition = threading.Condition(self.lock)
+        # 正在运行的任务，dict保持调度顺序并且可以O(1)删除
+        self.tasks = {}
         self.task_order = []
         self.task_index = 0
-        self.is_notconcurrent = {}
-        # 作用域包含的case的集合，当集合为空时，说明作用域已经完全执行完了可以卸载作用域了。
-        self.stack_map_case = {}
-        # 存储作用域对应的fuxture执行结果
+        # case声明占用的资源，(资源名称, 最大同时占用数量, 是否为共享占用)
+        self.item_resources = {}
+        # 各资源当前被独占、共享占用的数量
+        self.resource_exclusive = defaultdict(int)
+        self.resource_shared = defaultdict(int)
+        self.memory_report = config.getoption(f"--{GROUP_MEMORY_REPORT}")
+        self.plan_cache = config.getoption(f"--{GROUP_PLAN_CACHE}")
+        # 当前任务运行的分片，(分片下标, 分片数量)
+        shard = parse_config(config, GROUP_SHARD)
+        self.shard = None
+        if shard:
+            from .shard import parse_shard
+            self.shard = parse_shard(shard)
+        # case失败时的处理，以及已经有case失败的分组，分组id -> 失败的case
+        self.failfast = parse_config(config, GROUP_FAILFAST)
+        self.failed_groups = {}
+        self.nodeid_index = None
+        self.session = None
+        # case运行的超时时间，@pytest.mark.group_timeout单独声明的超时时间
+        self.timeout = float(parse_config(config, GROUP_TIMEOUT) or 0)
+        self.item_timeouts = {}
+        # 正在运行的case的截止时间和所在线程，超时后被放弃的case及其所在线程，已经更新过作用域计数的case
+        self.deadlines = {}
+        self.abandoned = {}
+        self.scope_released = set()
+        self.watchdog = None
+        self.watchdog_stop = threading.Event()
+        self.executor = None
+        self.exitstatus = 0
+        # 替换为ThreadLocalEnviron之前的os.environ，运行结束时恢复
+        self.environ = None
+        # 解释器没有启用GIL时，线程池中的case在多个cpu核上并行运行，在收集完case后检测
+        self.parallel = False
+        # 多个线程、worker进程、协程同时运行case时，由单独的线程输出报告，线程池和事件循环中的case按线程(协程)捕获输出
+        self.report_order = parse_config(config, GROUP_REPORT_ORDER) or "completion"
+        self.reporter = None
+        self.thread_capture = None
+        # 作用域下未执行完的case数量，为0时说明作用域已经完全执行完了可以卸载作用域了。
+        self.stack_remaining = defaultdict(int)
+        # 存储作用域对应的fuxture执行结果，每个作用域的执行结果是不可变的快照，发布时复制后整体替换，读取时不需要加锁
         self.stack_map_fuxturedef = {}
+        # 作用域下fixture的终结器，作用域下的case全部被跳过时用于直接卸载fixture
+        self.scope_finalizers = {}
+        # fixture实例(fixturedef、作用域、参数)对应的锁，以及各fixture的锁竞争次数
+        self.fixture_locks = {}
+        self.fixture_lock_contention = defaultdict(int)
 
     def pytest_configure(self, config):
         # 声明@pytest.mark.group
         config.addinivalue_line("markers", f"{CASE_GROUP_TAG}: 装饰case(类、模块、函数)，声明case默认默认的分组规则")
         # 声明@pytest.mark.notconcurrent
         config.addinivalue_line("markers", f"{NOTCONCURRENT}: 声明case不接受并发")
+        # 声明@pytest.mark.process
+        config.addinivalue_line("markers", f"{PROCESS_LANE}: hybrid执行模式下，声明case在worker进程中运行")
         # 声明@pytest.mark.resource
-        config.addinivalue_line("markers", f"{RESOURCE}: 声明case使用的资源")
+        config.addinivalue_line("markers", f"{RESOURCE}(*names, max=1, shared=False): 声明case使用的资源，"
+                                           f"max为资源允许同时独占的数量，shared=True时与其他共享占用者并发")
+        # 声明@pytest.mark.group_timeout
+        config.addinivalue_line("markers", f"{GROUP_TIMEOUT_MARKER}(seconds): 声明case运行的超时时间，覆盖--{GROUP_TIMEOUT}，"
+                                           f"为0时不限制")
 
     @pytest.mark.tryfirst
     def pytest_sessionstart(self, session):
         import _pytest
+        self.session = session
         # 创建线程安全的session
         _pytest.runner.SetupState = ThreadLocalSetupState
 
@@ -223,17 +581,25 @@ class GroupRunner(object):
         # 但是添加这个这个配置之后，会有fixture重入问题
         _pytest.fixtures.FixtureDef = ThreadLocalFixtureDef
 
-        # 创建线程安全的os.environ
-        os.environ = ThreadLocalEnviron(os.environ)
+        # 多个线程同时运行case时，按线程隔离os.environ中的PYTEST_CURRENT_TEST
+        if self.thread_count > 1:
+            # 从上层pytest进程继承的值会与线程中的值重复出现
+            os.environ.pop(CURRENT_TEST_VAR, None)
+            self.environ = os.environ
+            os.environ = ThreadLocalEnviron(os.environ)
 
         def _schedule_finalizers(request: FixtureRequest, fixturedef: "FixtureDef",
                                  subrequest: "SubRequest") -> None:
             scope = subrequest.node
 
-            with self.lock:
-                # 记录作用域和对应的fixturedef的执行结果、终结器
-                self.stack_map_fuxturedef.setdefault(scope, {})[fixturedef] = (
-                    fixturedef._finalizers, fixturedef.cached_result)
+            # 记录作用域和对应的fixturedef的执行结果、终结器；function作用域的fixture不在线程间共享，不需要记录
+            if fixturedef.scope != "function":
+                self.publish_fixture_result(scope, fixturedef)
+                if (self.failfast or self.timeout or self.item_timeouts) and \
+                        fixturedef not in self.scope_finalizers.get(scope, ()):
+                    with self.lock:
+                        self.scope_finalizers.setdefault(scope, {})[fixturedef] = functools.partial(
+                            fixturedef.finish, request=subrequest)
 
             request.session._setupstate.addfinalizer(
                 functools.partial(fixturedef.finish, request=subrequest), scope
@@ -254,121 +620,1020 @@ class GroupRunner(object):
         #
         # # _fillfixtures是一个内部方法，在执行测试函数或fixture函数过程中，这个方法会查找与参数名称相匹配的fixture，
         # # 并将fixture的返回值注入到测试函数或其他fixture函数中。
-        # # 其内部逻辑，如果fixture没有被调用，调用_get_active_fixturedef调用并缓存执行结果
+        # # 其内部逻辑，如果fixture没有被调用，调用FixtureDef.execute调用并缓存执行结果
         # # 但是在多线程运行case的场景下，会有线程同步问题(同一个fixture在不同线程中同时被执行，有不同的执行结果)
-        # # 所以要对_get_active_fixturedef限制并发调用
-        def sync_call(func):
+        # # 所以要对FixtureDef.execute限制并发调用，只限制同一个fixture实例(fixturedef、作用域、参数)的并发
+        def single_flight(func):
             """
-            装饰器，以相同的入参的调用函数时会被阻塞，使同时只能有一个并发
+            装饰器，同一个fixture实例同时只有一个线程在执行，先到的线程执行fixture，后到的线程等待并直接使用缓存的执行结果。
+            function作用域的fixture不会在线程间共享，不加锁
             """
-            function_thread_lock_dict = defaultdict(threading.Lock)
 
             @functools.wraps(func)
-            def run(obj, argname: str):
-                with function_thread_lock_dict[argname]:
-                    return func(obj, argname)
+            def execute(fixturedef, request):
+                if fixturedef.scope == "function":
+                    return func(fixturedef, request)
+
+                scope = request.node
+                key = (fixturedef, scope, request.param_index)
+                lock = self.fixture_locks.get(key)
+                if lock is None:
+                    with self.lock:
+                        lock = self.fixture_locks.get(key)
+                        if lock is None:
+                            lock = self.fixture_locks[key] = threading.RLock()
+
+                if not lock.acquire(blocking=False):
+                    # 记录锁竞争，等待其他线程执行完成
+                    start = self.tracer.now() if self.tracer else None
+                    lock.acquire()
+                    with self.lock:
+                        self.fixture_lock_contention[fixturedef.argname] += 1
+                    if start is not None:
+                        self.tracer.complete("fixture-lock", fixturedef.argname, start)
+                try:
+                    # 同步当前作用域的执行结果到当前线程，其他线程已经执行过的fixture不会被重复执行；
+                    # 当前作用域还没有执行结果时，清除当前线程中残留的其他作用域的执行结果
+                    record = self.stack_map_fuxturedef.get(scope, {}).get(fixturedef)
+                    if record:
+                        fixturedef._finalizers, fixturedef.cached_result = record
+                    else:
+                        fixturedef._finalizers, fixturedef.cached_result = [], None
+                    result = func(fixturedef, request)
+                    # 释放锁之前就发布执行结果，等待中的线程不会重复执行fixture
+                    self.publish_fixture_result(scope, fixturedef)
+                    return result
+                finally:
+                    lock.release()
+
+            return execute
+
+        FixtureDef.execute = single_flight(FixtureDef.execute)
+
+        if self.tracer:
+            def traced_finish(func):
+                """
+                装饰器，记录fixture卸载(执行终结器)的时间段；fixture没有执行过或已经卸载时不记录
+                """
+
+                @functools.wraps(func)
+                def finish(fixturedef, request):
+                    if fixturedef.cached_result is None and not fixturedef._finalizers:
+                        return func(fixturedef, request)
+                    start = self.tracer.now()
+                    try:
+                        return func(fixturedef, request)
+                    finally:
+                        self.tracer.complete("fixture-teardown", fixturedef.argname, start, scope=fixturedef.scope)
+
+                return finish
+
+            FixtureDef.finish = traced_finish(FixtureDef.finish)
+
+    @pytest.mark.trylast
+    def pytest_collection_modifyitems(self, session, config, items: list):
+        # case分组的单元的mark标签字符
+        plan_cache = None
+        if self.plan_cache and getattr(config, "cache", None) is not None:
+            from .plan import GroupPlanCache
+            plan_cache = GroupPlanCache(config.cache, self.get_plan_fingerprint(config))
+        notconcurrent = bytearray(len(items))
+        process_flags = bytearray(len(items))
+        # 各资源允许同时独占的数量，以及第一个声明它的case
+        resource_capacity = {}
+
+        for i, item in enumerate(items):
+            plan = plan_cache.get(item) if plan_cache else None
+            if plan is None:
+                plan = self.plan_item(config, item)
+                if plan_cache:
+                    plan_cache.put(item, plan)
+            groups, notconcurrent[i], resources, process_flags[i], timeout = plan
+            if timeout is not None:
+                self.item_timeouts[item] = timeout
+
+            for g in groups:
+                group_items = self.item_dict.setdefault(g, [])
+                # 多个分组单元可能计算出相同的分组，同一个case在分组中只记录一次
+                if not group_items or group_items[-1] is not item:
+                    group_items.append(item)
+            # 记录case声明占用的资源
+            if resources:
+                self.check_resource_capacity(item, resources, resource_capacity)
+                self.item_resources[item] = resources
+
+        if plan_cache:
+            logger.info("分组规划缓存", hits=plan_cache.hits, misses=plan_cache.misses)
+            plan_cache.save()
+
+        durations = self.load_durations(config)
+        if self.shard:
+            notconcurrent, process_flags = self.select_shard(config, items, durations, notconcurrent, process_flags)
+
+        if self.max_open_scopes:
+            for item in items:
+                scopes = tuple(c for c in item.listchain() if isinstance(c, (pytest.Module, pytest.Class)))
+                self.item_scopes.append(scopes)
+                for c in scopes:
+                    self.scope_remaining[c] += 1
+
+        self.build_group_index(items, durations, notconcurrent)
+
+        # 记录需要在worker进程中运行的case
+        if self.workers_mode == "process":
+            self.process_items = set(items)
+        elif self.workers_mode == "hybrid":
+            self.process_items = {item for i, item in enumerate(items) if process_flags[i]}
+
+        # 记录需要在事件循环中运行的协程case
+        if self.async_concurrency > 0:
+            self.async_items = {item for item in items if item not in self.process_items and
+                                isinstance(item, Function) and inspect.iscoroutinefunction(item.obj)}
+
+        # 记录作用域下case的数量，case自身总是在运行结束时卸载，不需要计数；worker进程中运行的case不占用当前进程的作用域
+        for item in items:
+            if item in self.process_items:
+                continue
+            for c in item.listchain()[:-1]:
+                self.stack_remaining[c] += 1
 
-            return run
+    def select_shard(self, config, items, durations, notconcurrent, process_flags) -> tuple:
+        """
+        只保留当前分片的case，其余的case按照deselected报告
 
-        FixtureRequest._get_active_fixturedef = sync_call(FixtureRequest._get_active_fixturedef)
+        :param items: 全部case，原地修改为当前分片的case
+        :param durations: 历史运行耗时，用于均衡各分片
+        :param notconcurrent: 按照收集顺序排列的notconcurrent标记
+        :param process_flags: 按照收集顺序排列的process标记
+        :return: tuple(当前分片的notconcurrent标记, 当前分片的process标记)
+        """
+        from .shard import find_components, assign_shards, get_item_weights
+
+        index, count = self.shard
+        item_index = {item: i for i, item in enumerate(items)}
+        groups = ([item_index[item] for item in group_items] for group_items in self.item_dict.values())
+        components = find_components(len(items), groups, notconcurrent)
+        shards = assign_shards(components, get_item_weights(items, durations), count)
+
+        selected = [i for i in range(len(items)) if shards[i] == index]
+        deselected = [item for i, item in enumerate(items) if shards[i] != index]
+        logger.info("分片", shard=f"{index + 1}/{count}", selected=len(selected), deselected=len(deselected),
+                    components=len(set(components)))
+        if deselected:
+            for item in deselected:
+                self.item_timeouts.pop(item, None)
+                self.item_resources.pop(item, None)
+            # 连通分量完整地属于同一个分片，分组要么全部保留，要么全部移除
+            self.item_dict = {g: group_items for g, group_items in self.item_dict.items()
+                              if shards[item_index[group_items[0]]] == index}
+            config.hook.pytest_deselected(items=deselected)
+        notconcurrent = bytearray(notconcurrent[i] for i in selected)
+        process_flags = bytearray(process_flags[i] for i in selected)
+        items[:] = [items[i] for i in selected]
+        return notconcurrent, process_flags
+
+    def plan_item(self, config, item) -> tuple:
+        """
+        规划case所属的分组，以及调度时需要的notconcurrent、resource、process标记
 
-    def pytest_collection_modifyitems(self, session, config, items: list):
-        # case分组的单元的mark标签字符
+        :param config:
+        :param item:
+        :return: tuple(分组key, 是否notconcurrent, 声明的资源, 是否标注了process, 声明的超时时间)
+        """
+        groups = []
+        # 读取@pytest.mark.unit_group对case定义的分组单元
+        for u in self.get_marker_or_default(config, item, CASE_GROUP_UNIT_TAG):
+            # 标记item到应该归属的分组，
+            groups.extend(self._gener_item_group_key(item, u))
+        timeout = item.get_closest_marker(GROUP_TIMEOUT_MARKER)
+        return (groups, item.get_closest_marker(NOTCONCURRENT) is not None, self.get_item_resources(item),
+                item.get_closest_marker(PROCESS_LANE) is not None, float(timeout.args[0]) if timeout else None)
 
-        for item in items:
-            # 读取@pytest.mark.unit_group对case定义的分组单元
-            units = self.get_marker_or_default(config, item, CASE_GROUP_UNIT_TAG)
+    @staticmethod
+    def get_plan_fingerprint(config) -> list:
+        """
+        影响全部case分组规划的配置：分组单元、插件自身、配置文件以及全部conftest.py的修改时间和大小
+        """
+        paths = [__file__, os.path.join(os.path.dirname(__file__), "plan.py")]
+        inifile = getattr(config, "inipath", None) or getattr(config, "inifile", None)
+        if inifile:
+            paths.append(str(inifile))
+        conftests = getattr(config.pluginmanager, "_conftest_plugins", ())
+        paths.extend(sorted(str(getattr(m, "__file__", "")) for m in conftests))
+        fingerprint = [str(parse_config(config, CASE_GROUP_UNIT_TAG))]
+        for path in paths:
+            try:
+                st = os.stat(path)
+                fingerprint.append([path, st.st_mtime_ns, st.st_size])
+            except OSError:
+                fingerprint.append([path])
+        return fingerprint
+
+    def build_group_index(self, items, durations=None, notconcurrent=None):
+        """
+        根据分组结果构建分组索引，检查任务是否可运行时只需要查看任务所属的分组
+
+        :param items: 全部待执行的case
+        :param durations: 历史运行耗时，nodeid -> 秒，调度策略为critical-path时使用
+        :param notconcurrent: 按照收集顺序排列的notconcurrent标记，为None时从case的marker读取
+        :return:
+        """
+        self.items = list(items)
+        self.item_index = {item: i for i, item in enumerate(self.items)}
+        n = len(self.items)
+        self.group_keys = list(self.item_dict.keys())
+        self.group_start = array("l", [0])
+        self.group_members = array("l")
+        group_count = array("l", [0]) * n
+        for group_items in self.item_dict.values():
+            for item in group_items:
+                i = self.item_index[item]
+                self.group_members.append(i)
+                group_count[i] += 1
+            self.group_start.append(len(self.group_members))
+        self.group_cursor = self.group_start[:-1]
+        # 分组结果已经全部转换为分组索引
+        self.item_dict = {}
 
-            for u in units:
-                # 标记item到应该归属的分组，
-                groups = self._gener_item_group_key(item, u)
+        self.item_group_start = array("l", [0]) * (n + 1)
+        for i in range(n):
+            self.item_group_start[i + 1] = self.item_group_start[i] + group_count[i]
+        self.item_group_ids = array("l", [0]) * len(self.group_members)
+        self.item_group_slots = array("l", [0]) * len(self.group_members)
+        # 按照分组id的顺序填充，case所属的分组按照分组id排列
+        fill = self.item_group_start[:-1]
+        for gid in range(len(self.group_keys)):
+            for slot in range(self.group_start[gid], self.group_start[gid + 1]):
+                i = self.group_members[slot]
+                self.item_group_ids[fill[i]] = gid
+                self.item_group_slots[fill[i]] = slot
+                fill[i] += 1
+
+        if self.schedule == "critical-path" and durations:
+            self.item_priority = array("d", (-cp for cp in self.compute_critical_path(durations)))
+        else:
+            self.item_priority = array("d", [0.0]) * n
+        if notconcurrent is None:
+            notconcurrent = (item.get_closest_marker(NOTCONCURRENT) is not None for item in self.items)
+        self.notconcurrent = bytearray(notconcurrent)
+        self.dispatched = bytearray(n)
+
+        # 在所有分组中都排在第一位的case可以直接运行
+        self.item_waiting = array("l", [0]) * n
+        self.ready = []
+        for i in range(n):
+            waiting = 0
+            for k in range(self.item_group_start[i], self.item_group_start[i + 1]):
+                if self.item_group_slots[k] != self.group_start[self.item_group_ids[k]]:
+                    waiting += 1
+            self.item_waiting[i] = waiting
+            if not waiting:
+                self.ready.append((self.item_priority[i], i))
+        heapq.heapify(self.ready)
+        if self.max_open_scopes:
+            for entry in self.ready:
+                self._track_scope_ready(entry)
+
+    def iter_item_groups(self, i):
+        """
+        遍历case所属的分组
 
-                for g in groups:
-                    self.item_dict.setdefault(g, []).append(item)
+        :param i: case编号
+        :return: (分组id, case在group_members中的下标)
+        """
+        for k in range(self.item_group_start[i], self.item_group_start[i + 1]):
+            yield self.item_group_ids[k], self.item_group_slots[k]
 
-        # 记录case和作用域的对应关系
-        for item in items:
-            lc = item.listchain()
-            for c in lc:
-                s = self.stack_map_case.setdefault(c, set())
-                s.add(item)
-        pass
+    def compute_critical_path(self, durations) -> array:
+        """
+        计算每个case的剩余关键路径长度，即case自身耗时加上其在各分组中后继case的关键路径的最大值
+
+        分组内后继case的收集顺序总是靠后，所以倒序遍历一次即可；没有历史耗时的case按照已知耗时的平均值估算
+
+        :param durations: 历史运行耗时，nodeid -> 秒
+        :return: array，case编号 -> 关键路径长度(秒)
+        """
+        default = sum(durations.values()) / len(durations)
+        critical_path = array("d", [0.0]) * len(self.items)
+        for i in range(len(self.items) - 1, -1, -1):
+            successor_path = 0.0
+            for gid, slot in self.iter_item_groups(i):
+                if slot + 1 < self.group_start[gid + 1]:
+                    successor_path = max(successor_path, critical_path[self.group_members[slot + 1]])
+            critical_path[i] = durations.get(self.items[i].nodeid, default) + successor_path
+        return critical_path
+
+    @staticmethod
+    def load_durations(config) -> dict:
+        """
+        从.pytest_cache中读取上次运行记录的case耗时
+
+        :param config:
+        :return: dict，nodeid -> 秒，没有缓存时为空
+        """
+        cache = getattr(config, "cache", None)
+        if cache is None:
+            return {}
+        return cache.get(DURATIONS_CACHE_KEY, {})
+
+    @pytest.mark.tryfirst
+    def pytest_runtest_logreport(self, report):
+        if self.abandoned and not getattr(report, "group_timeout", False) and self.is_abandoned(report.nodeid):
+            # 超时的case已经报告为失败，其所在线程恢复后的报告不再交给其他插件，同时结束这个case的运行
+            raise AbandonedItemError(report.nodeid)
+        # 记录case在setup、call、teardown阶段的总耗时
+        with self.lock:
+            self.durations[report.nodeid] += report.duration
+            if self.failfast and report.failed:
+                self.fail_item_groups(report.nodeid)
+
+    def fail_item_groups(self, nodeid):
+        """
+        case失败后，标记其所属的分组失败，分组中还未运行的case在调度时会被跳过；session模式下停止调度新的case，调用方需要持有self.lock
+        """
+        if self.failfast == "session":
+            if self.session is not None and not self.session.shouldfail:
+                self.session.shouldfail = f"{GROUP_FAILFAST}: {nodeid}失败"
+            return
+        i = self.get_nodeid_index(nodeid)
+        if i is None:
+            return
+        for gid, _ in self.iter_item_groups(i):
+            if gid not in self.failed_groups:
+                logger.info("分组中有case失败，跳过分组中后续的case", case=nodeid, group=self.get_group_name(gid))
+                self.failed_groups[gid] = nodeid
+
+    def get_nodeid_index(self, nodeid) -> Optional[int]:
+        """
+        case在收集顺序中的下标，用于处理worker进程回传的、只有nodeid的报告
+        """
+        if self.nodeid_index is None:
+            self.nodeid_index = {item.nodeid: i for i, item in enumerate(self.items)}
+        return self.nodeid_index.get(nodeid)
+
+    def get_skip_reason(self, task) -> Optional[str]:
+        """
+        任务所属的分组中已经有case失败时，返回跳过任务的原因
+        """
+        if not self.failed_groups:
+            return None
+        with self.lock:
+            for gid, _ in self.iter_item_groups(self.item_index[task]):
+                if gid in self.failed_groups:
+                    return f"{GROUP_FAILFAST}: 分组{self.get_group_name(gid)}中的{self.failed_groups[gid]}失败"
+        return None
+
+    def pytest_sessionfinish(self, session, exitstatus):
+        self.exitstatus = exitstatus
+        if self.tracer:
+            self.tracer.dump()
+
+        # 将本次运行的耗时合并到缓存中，供下次运行critical-path调度使用
+        cache = getattr(session.config, "cache", None)
+        if cache is None or not self.durations:
+            return
+        durations = self.load_durations(session.config)
+        durations.update(self.durations)
+        cache.set(DURATIONS_CACHE_KEY, durations)
+
+    @pytest.mark.trylast
+    def pytest_unconfigure(self, config):
+        if self.environ is not None:
+            os.environ = self.environ
+            self.environ = None
+        alive = [ident for ident in self.abandoned.values()
+                 if any(t.ident == ident and t.is_alive() for t in threading.enumerate())]
+        if alive:
+            # 超时的case所在线程仍然阻塞，解释器退出时会一直等待这些线程，所有报告都已经输出，直接退出进程
+            logger.warning("超时的case仍未结束，直接退出进程", threads=len(alive))
+            logger.close()
+            sys.stdout.flush()
+            sys.stderr.flush()
+            os._exit(int(self.exitstatus))
+
+    def pytest_terminal_summary(self, terminalreporter):
+        if self.fixture_lock_contention and terminalreporter.config.option.verbose > 0:
+            terminalreporter.write_sep("=", "pytest-groups fixture lock contention")
+            for argname, count in sorted(self.fixture_lock_contention.items(), key=lambda kv: kv[1], reverse=True):
+                terminalreporter.write_line(f"{count:8d}  {argname}")
+
+        if self.autoscaler:
+            terminalreporter.write_sep("=", "pytest-groups thread autoscaling")
+            for line in self.autoscaler.summary():
+                terminalreporter.write_line(line)
+
+        if self.memory_report:
+            terminalreporter.write_sep("=", "pytest-groups scheduler memory")
+            for line in self.get_memory_report():
+                terminalreporter.write_line(line)
+
+        if self.tracer is None:
+            return
+        terminalreporter.write_sep("=", "pytest-groups trace")
+        for line in self.tracer.summary(sum(self.lane_capacity.values())):
+            terminalreporter.write_line(line)
+
+    def get_memory_report(self) -> list:
+        """
+        统计调度状态各部分占用的内存，并按照相同的内容构造以case对象为key的dict/list/set，对比两种存储方式的内存占用
+
+        :return: 报告的文本行
+        """
+        from .memory import deep_sizeof, format_size
+
+        shared = (pytest.Item, pytest.Collector)
+        n = len(self.items)
+        legacy_groups = [[self.items[i] for i in self.group_members[self.group_start[gid]:self.group_start[gid + 1]]]
+                         for gid in range(len(self.group_keys))]
+        legacy_stack = {}
+        for item in self.items:
+            if item not in self.process_items:
+                for c in item.listchain():
+                    legacy_stack.setdefault(c, set()).add(item)
+        rows = [
+            ("item ids", (self.items, self.item_index), self.item_index),
+            ("group index",
+             (self.group_start, self.group_members, self.item_group_start, self.item_group_ids,
+              self.item_group_slots, self.group_cursor),
+             (legacy_groups, {self.items[i]: [(gid, slot - self.group_start[gid])
+                                              for gid, slot in self.iter_item_groups(i)] for i in range(n)},
+              list(self.group_cursor))),
+            ("waiting counters", self.item_waiting, {item: self.item_waiting[i] for i, item in enumerate(self.items)}),
+            ("priorities", self.item_priority, {item: (self.item_priority[i], i) for i, item in enumerate(self.items)}),
+            ("notconcurrent", self.notconcurrent, {item: bool(self.notconcurrent[i]) for i, item in enumerate(self.items)}),
+            ("dispatched", self.dispatched, set(self.items) if self.max_open_scopes else set()),
+            ("scope counters", self.stack_remaining, legacy_stack),
+        ]
+        lines = [f"items: {n}, groups: {len(self.group_keys)}",
+                 f"{'':<18} {'compact':>10} {'per-item':>10}"]
+        total_compact = total_legacy = 0
+        for name, compact, legacy in rows:
+            compact_size, legacy_size = deep_sizeof(compact, shared), deep_sizeof(legacy, shared) if legacy else 0
+            total_compact += compact_size
+            total_legacy += legacy_size
+            lines.append(f"{name:<18} {format_size(compact_size):>10} {format_size(legacy_size):>10}")
+        lines.append(f"{'total':<18} {format_size(total_compact):>10} {format_size(total_legacy):>10}")
+        return lines
+
+    def release_task_groups(self, item):
+        """
+        任务执行完成后推进其所属分组的游标，并将因此可以运行的任务加入就绪队列，调用方需要持有self.lock
+
+        :param item: 已执行完成的任务
+        :return:
+        """
+        for gid, slot in self.iter_item_groups(self.item_index[item]):
+            self.group_cursor[gid] = slot + 1
+            if slot + 1 < self.group_start[gid + 1]:
+                successor = self.group_members[slot + 1]
+                self.item_waiting[successor] -= 1
+                if not self.item_waiting[successor] and self.items[successor] not in self.leased:
+                    self.push_ready(successor)
+
+    def push_ready(self, i):
+        """
+        将任务加入就绪队列，调用方需要持有self.lock
+
+        :param i: case编号
+        """
+        entry = (self.item_priority[i], i)
+        heapq.heappush(self.ready, entry)
+        if self.max_open_scopes:
+            self._track_scope_ready(entry)
+
+    def _track_scope_ready(self, entry):
+        """
+        所在作用域都已经打开的任务同时加入优先队列，否则等待作用域打开时再加入
+        """
+        closed = [c for c in self.item_scopes[entry[1]] if c not in self.open_scopes]
+        if closed:
+            for c in closed:
+                self.scope_ready_items[c].append(entry)
+        else:
+            heapq.heappush(self.local_ready, entry)
+
+    def open_task_scopes(self, task):
+        """
+        任务被调度时打开其所在的作用域，之前已经就绪的同作用域任务加入优先队列，调用方需要持有self.lock
+        """
+        i = self.item_index[task]
+        self.dispatched[i] = 1
+        for c in self.item_scopes[i]:
+            if c in self.open_scopes:
+                continue
+            self.open_scopes.add(c)
+            for entry in self.scope_ready_items.pop(c, ()):
+                if not self.dispatched[entry[1]] and \
+                        all(s in self.open_scopes for s in self.item_scopes[entry[1]]):
+                    heapq.heappush(self.local_ready, entry)
+
+    def close_task_scopes(self, task):
+        """
+        任务完成时更新作用域下未完成的任务数量，全部完成的作用域会被卸载，不再计入打开的作用域，调用方需要持有self.lock
+        """
+        for c in self.item_scopes[self.item_index[task]]:
+            self.scope_remaining[c] -= 1
+            if not self.scope_remaining[c]:
+                self.open_scopes.discard(c)
+                self.scope_ready_items.pop(c, None)
+
+    def can_open_scopes(self, task) -> bool:
+        """
+        检查调度任务后打开的作用域数量是否超过限制；没有正在运行的任务时总是允许，避免分组跨作用域时无法继续调度
+        """
+        needed = sum(1 for c in self.item_scopes[self.item_index[task]] if c not in self.open_scopes)
+        return not needed or not self.tasks or len(self.open_scopes) + needed <= self.max_open_scopes
+
+    @pytest.mark.hookwrapper
+    def pytest_runtest_setup(self, item):
+        if self.tracer is None and self.thread_capture is None:
+            yield
+            return
+        with self.run_phase(item, "setup"):
+            yield
+
+    @pytest.mark.hookwrapper
+    def pytest_runtest_call(self, item):
+        if self.tracer is None and self.thread_capture is None:
+            yield
+            return
+        with self.run_phase(item, "call"):
+            yield
+
+    @contextlib.contextmanager
+    def run_phase(self, item, when):
+        """
+        记录case一个阶段的运行时间，并捕获当前线程在这个阶段的输出，作为报告的section
+        """
+        start = self.tracer.now() if self.tracer else None
+        if self.thread_capture:
+            self.thread_capture.start()
+        try:
+            yield
+        finally:
+            if self.thread_capture:
+                out, err = self.thread_capture.stop()
+                item.add_report_section(when, "stdout", out)
+                item.add_report_section(when, "stderr", err)
+            if start is not None:
+                self.tracer.complete(when, item.nodeid, start)
+
+    @pytest.mark.tryfirst
+    def pytest_runtest_protocol(self, item, nextitem):
+        """
+        线程池中的case运行时不直接调用报告相关的hook，运行完成后将全部报告交给输出报告的线程
+        """
+        if self.reporter is None or item in self.process_items or item in self.async_items:
+            return None
+        reports = runtestprotocol(item, nextitem=nextitem, log=False)
+        with self.lock:
+            if item in self.abandoned:
+                # 超时的case已经报告为失败
+                raise AbandonedItemError(item.nodeid)
+            # 分组失败需要在case运行结束、释放分组之前标记，不能等报告输出
+            if self.failfast and any(report.failed for report in reports):
+                self.fail_item_groups(item.nodeid)
+        self.log_reports(item, reports)
+        return True
+
+    def log_reports(self, item, reports, logstart=True):
+        """
+        调用case报告相关的hook，有输出报告的线程时交给输出报告的线程
+        """
+        ihook = item.ihook
+        calls = []
+        if logstart:
+            calls.append((ihook.pytest_runtest_logstart, {"nodeid": item.nodeid, "location": item.location}))
+        calls.extend((ihook.pytest_runtest_logreport, {"report": report}) for report in reports)
+        calls.append((ihook.pytest_runtest_logfinish, {"nodeid": item.nodeid, "location": item.location}))
+        if self.reporter is None:
+            for hook, kwargs in calls:
+                hook(**kwargs)
+            return
+        self.reporter.put(calls, self.get_report_group(self.item_index[item]))
+
+    def get_report_group(self, i) -> Optional[int]:
+        """
+        输出报告时case所属的分组：case所属的第一个分组，不属于任何分组时为None
+        """
+        start, end = self.item_group_start[i], self.item_group_start[i + 1]
+        return self.item_group_ids[start] if end > start else None
+
+    def put_worker_reports(self, nodeid, calls):
+        """
+        worker进程回传的一个case的全部报告交给输出报告的线程，分组失败在这里立即标记
+        """
+        if self.failfast and any(kwargs["report"].failed for _, kwargs in calls if "report" in kwargs):
+            with self.lock:
+                self.fail_item_groups(nodeid)
+        with self.lock:
+            i = self.get_nodeid_index(nodeid)
+        self.reporter.put(calls, self.get_report_group(i) if i is not None else None)
+
+    def start_reporter(self):
+        """
+        启动输出报告的线程，order为group时以case所属的第一个分组作为输出时的分组
+        """
+        group_sizes = defaultdict(int)
+        for i in range(len(self.items)):
+            group = self.get_report_group(i)
+            if group is not None:
+                group_sizes[group] += 1
+        from .reporter import OrderedReporter
+        self.reporter = OrderedReporter(self.report_order, group_sizes)
+        self.reporter.start()
+
+    @pytest.mark.hookwrapper
+    def pytest_fixture_setup(self, fixturedef, request):
+        if self.tracer is None:
+            yield
+            return
+        start = self.tracer.now()
+        yield
+        self.tracer.complete("fixture", fixturedef.argname, start, scope=fixturedef.scope)
 
     def pytest_runtest_teardown(self, item: Item, nextitem: Optional[Item]) -> None:
         # return True
+        if self.thread_capture:
+            with self.run_phase(item, "teardown"):
+                return self._teardown_item(item)
+        if self.tracer is None:
+            return self._teardown_item(item)
+        start = self.tracer.now()
+        self._teardown_item(item)
+        self.tracer.complete("teardown", item.nodeid, start)
+
+    def _teardown_item(self, item):
         _update_current_test_var(item, "teardown")
 
-        # 根据case的stack,更新作用域下未执行的case的记录，如果作用域下无待执行的case,说明作用域已完成，执行卸载操作
+        # 根据case的stack,更新作用域下未执行的case的数量，如果作用域下无待执行的case,说明作用域已完成，执行卸载操作
         lc = item.listchain()
         lc.reverse()
-        for c in lc:
-            s: set = self.stack_map_case.get(c)
-            s.remove(item)
-            logger.info(f"case: {item} 已完成，作用域： {c.nodeid} 下剩余任务数量为：{len(s)}")
-            if len(s) == 0:
-                logger.info(f"case: {item} 已完成，作用域： {c.nodeid} 作用域正在被卸载")
+        if self.watchdog:
+            with self.lock:
+                if item in self.abandoned:
+                    return
+                self.scope_released.add(item)
+        item.session._setupstate._pop_and_teardown()
+        for c in lc[1:]:
+            with self.lock:
+                self.stack_remaining[c] -= 1
+                remaining = self.stack_remaining[c]
+                if remaining == 0:
+                    self.scope_finalizers.pop(c, None)
+            logger.debug("case已完成", case=item.nodeid, scope=c.nodeid, remaining=remaining)
+            if remaining == 0:
+                logger.info("作用域正在被卸载", case=item.nodeid, scope=c.nodeid)
                 item.session._setupstate._pop_and_teardown()
             else:
                 item.session._setupstate.stack.pop()
 
         _update_current_test_var(item, None)
 
-    def init_thread_env(self, item: Function):
+    def skip_one_item(self, item, reason):
         """
-        初始化线程相关的case运行上下文，包括session._setupstate.stack、fixturedef
-        :param item: 要运行的case
-        :return:
+        跳过任务：不运行case，直接报告为skipped，并像case运行完成一样释放分组、资源和作用域
+        """
+        try:
+            self.log_reports(item, [skipped_report(item, reason)])
+            if item not in self.process_items:
+                self.teardown_skipped_scopes(item)
+        except Exception as e:
+            logger.exception(e)
+            raise e
+        finally:
+            self.finish_task(item)
+
+    def teardown_skipped_scopes(self, item):
+        """
+        被跳过的case不会运行teardown，在这里更新作用域下未执行的case数量；
+        作用域因此全部完成时，当前线程没有这个作用域的SetupState，直接执行作用域下fixture的终结器
         """
-        # 获取倒序的stack
         lc = item.listchain()
         lc.reverse()
+        for c in lc[1:]:
+            with self.lock:
+                self.stack_remaining[c] -= 1
+                if self.stack_remaining[c]:
+                    continue
+                finalizers = self.scope_finalizers.pop(c, {})
+            logger.info("作用域正在被卸载", case=item.nodeid, scope=c.nodeid)
+            for fixturedef, finish in reversed(list(finalizers.items())):
+                with self.lock:
+                    record = self.stack_map_fuxturedef.get(c, {}).get(fixturedef)
+                if record:
+                    fixturedef._finalizers, fixturedef.cached_result = record
+                try:
+                    finish()
+                except Exception as e:
+                    logger.exception(e, scope=c.nodeid, fixture=fixturedef.argname)
 
-        # 存储作用域对应的stack
-        self.stack_map_content = {}
+    def init_thread_env(self, item: Function):
+        """
+        初始化线程相关的case运行上下文，包括session._setupstate.stack、fixturedef
 
-        # 初始化session._setupstate.stack
+        只读取各作用域已经发布的不可变快照，不需要加锁
+        :param item: 要运行的case
+        :return:
+        """
+        # 初始化session._setupstate.stack，各作用域在setup时重新入栈
         setupstate: SetupState = item.session._setupstate
         setupstate.stack = []
         setupstate._finalizers = {}
-        for c in lc:
-            stack_finalizers_tuple = self.stack_map_content.get(c)
-            if stack_finalizers_tuple:
-                setupstate.stack.append(c)
-                finalizers = stack_finalizers_tuple[1]
-                if finalizers.get(c):
-                    setupstate.addfinalizer(finalizers.get(c), c)
-            else:
-                # 对应的stack没有缓存，说明对应stack还没有执行过，直接执行即可
-                continue
 
         # 初始化fixturedef
-        for c in lc:
-            map = self.stack_map_fuxturedef.get(c)
-            if map:
-                for fixturedef, t in map.items():
-                    fixturedef._finalizers = t[0]
-                    fixturedef.cached_result = t[1]
-            else:
-                continue
-        pass
+        snapshots = self.stack_map_fuxturedef
+        for c in item.listchain():
+            snapshot = snapshots.get(c)
+            if snapshot:
+                for fixturedef, (finalizers, cached_result) in snapshot.items():
+                    fixturedef._finalizers = finalizers
+                    fixturedef.cached_result = cached_result
+
+    def publish_fixture_result(self, scope, fixturedef):
+        """
+        发布当前线程中fixture在作用域下的执行结果：复制作用域的快照并加入执行结果后整体替换，已经发布过的快照不会再被修改，
+        init_thread_env读取时不需要加锁；执行结果没有变化时不重新发布
+        """
+        record = self.stack_map_fuxturedef.get(scope, {}).get(fixturedef)
+        if record is not None and record[0] is fixturedef._finalizers and record[1] is fixturedef.cached_result:
+            return
+        with self.lock:
+            snapshot = dict(self.stack_map_fuxturedef.get(scope, {}))
+            snapshot[fixturedef] = (fixturedef._finalizers, fixturedef.cached_result)
+            self.stack_map_fuxturedef[scope] = snapshot
+
+    def get_item_timeout(self, item) -> float:
+        return self.item_timeouts.get(item, self.timeout)
+
+    def is_abandoned(self, nodeid) -> bool:
+        with self.lock:
+            return any(item.nodeid == nodeid for item in self.abandoned)
+
+    def watchdog_loop(self):
+        """
+        watchdog线程：定期检查正在运行的case，超过截止时间的case被放弃
+        """
+        while not self.watchdog_stop.wait(0.1):
+            now = time.monotonic()
+            with self.lock:
+                expired = [item for item, (deadline, _) in self.deadlines.items() if deadline <= now]
+            for item in expired:
+                try:
+                    self.abandon_item(item)
+                except Exception as e:
+                    logger.exception(e, case=item.nodeid)
+
+    def abandon_item(self, item):
+        """
+        放弃超时的case：报告为失败并附上所在线程的堆栈，释放占用的分组、资源和作用域，并为线程池补充一个线程。
+        python无法终止线程，case所在线程恢复后不会再输出报告
+        """
+        with self.lock:
+            deadline = self.deadlines.pop(item, None)
+            if deadline is None:
+                return
+            ident = deadline[1]
+            self.abandoned[item] = ident
+            released = item in self.scope_released
+        timeout = self.get_item_timeout(item)
+        frame = sys._current_frames().get(ident)
+        stack = "".join(traceback.format_stack(frame)) if frame is not None else ""
+        logger.warning("case运行超时", case=item.nodeid, timeout=timeout)
+
+        longrepr = f"{GROUP_TIMEOUT}: case运行超过{timeout}秒，已释放其占用的线程、分组和资源\n\n" \
+                   f"case所在线程的堆栈：\n{stack}"
+        report = TestReport(item.nodeid, item.location, {x: 1 for x in item.keywords}, "failed", longrepr, "call",
+                            sections=[], duration=timeout)
+        report.group_timeout = True
+        # 没有输出报告的线程时，case开始运行时已经调用过pytest_runtest_logstart
+        self.log_reports(item, [report], logstart=self.reporter is not None)
+
+        if not released:
+            self.teardown_skipped_scopes(item)
+        if self.executor is not None:
+            # 阻塞的线程无法回收，线程池补充一个线程，保持可同时运行的case数量
+            self.executor._max_workers += 1
+        self.finish_task(item)
 
     @staticmethod
     def run_one_test_item(self, session, item, nextitem=None):
         try:
+            timeout = self.get_item_timeout(item)
+            self.init_thread_env(item)
+            if timeout:
+                with self.lock:
+                    self.deadlines[item] = (time.monotonic() + timeout, threading.get_ident())
+
+            if self.autoscaler:
+                # 记录case运行的耗时和占用cpu的耗时，用于计算等待IO的时间占比
+                start, start_cpu = time.perf_counter(), time.thread_time()
+                item.config.hook.pytest_runtest_protocol(item=item, nextitem=None)
+                self.autoscaler.record(time.perf_counter() - start, time.thread_time() - start_cpu)
+            else:
+                item.config.hook.pytest_runtest_protocol(item=item, nextitem=None)
+            if session.shouldfail:
+                raise session.Failed(session.shouldfail)
+            if session.shouldstop:
+                raise session.Interrupted(session.shouldstop)
+        except AbandonedItemError:
+            logger.info("超时的case已结束", case=item.nodeid)
+        except Exception as e:
+            logger.exception(e)
+            raise e
+        finally:
             with self.lock:
-                self.init_thread_env(item)
+                self.deadlines.pop(item, None)
+            self.finish_task(item)
+
+    def run_one_process_item(self, session, batch):
+        """
+        在worker进程中按顺序运行一组case，报告由worker进程回传后在当前进程中处理
+        """
+        pending = {item.nodeid: item for item in batch}
+
+        def on_done(nodeid):
+            self.finish_task(pending.pop(nodeid))
 
-            item.config.hook.pytest_runtest_protocol(item=item, nextitem=None)
+        try:
+            self.worker_pool.run([item.nodeid for item in batch], on_done)
             if session.shouldfail:
                 raise session.Failed(session.shouldfail)
             if session.shouldstop:
                 raise session.Interrupted(session.shouldstop)
+        except RuntimeError as e:
+            # worker进程异常退出或没有可用的worker进程，停止调度新的case，运行结束时报告失败
+            logger.exception(e)
+            if pending:
+                # 正在运行的case报告为失败，同一批中后续的case没有运行
+                item = next(iter(pending.values()))
+                report = TestReport(item.nodeid, item.location, {x: 1 for x in item.keywords}, "failed", str(e), "call",
+                                    sections=[], duration=0)
+                self.log_reports(item, [report])
+            with self.condition:
+                if not session.shouldfail:
+                    session.shouldfail = str(e)
+                self.condition.notify_all()
         except Exception as e:
             logger.exception(e)
             raise e
         finally:
-            with self.lock:
-                self.tasks.remove(item)
+            # worker进程异常时，释放没有运行完成的case，避免后续任务无法调度
+            for item in list(pending.values()):
+                self.finish_task(item)
+
+    async def run_async_item(self, session, item):
+        """
+        在事件循环中运行协程case
+
+        setup、teardown阶段在事件循环线程中同步执行，测试函数的协程在事件循环中await，等待IO时不占用线程。
+        同一个线程中交替运行多个case，所以每个阶段开始前都要恢复case自己的SetupState和function作用域的fixture
+        """
+        try:
+            self.init_thread_env(item)
+            setupstate: SetupState = item.session._setupstate
+            # 其他case正在await时，它的function作用域fixture的执行结果还留在共享的fixturedef上
+            function_fixtures = self.get_function_fixturedefs(item)
+            for fixturedef in function_fixtures:
+                fixturedef.cached_result, fixturedef._finalizers = None, []
+            # 报告和线程池中的case一样，运行结束后统一交给输出报告的线程
+            reports = [call_and_report(item, "setup", log=False)]
+            stack, finalizers = setupstate.stack, setupstate._finalizers
+            fixture_results = [(fixturedef.cached_result, fixturedef._finalizers) for fixturedef in function_fixtures]
+
+            if reports[0].passed and not item.config.getoption("setuponly", False):
+                reports.append(await self._call_async_item(item))
+
+            setupstate.stack, setupstate._finalizers = stack, finalizers
+            for fixturedef, (cached_result, fixture_finalizers) in zip(function_fixtures, fixture_results):
+                fixturedef.cached_result, fixturedef._finalizers = cached_result, fixture_finalizers
+            reports.append(call_and_report(item, "teardown", log=False, nextitem=None))
+            item._request = False
+            item.funcargs = None
+            if self.failfast and any(report.failed for report in reports):
+                with self.lock:
+                    self.fail_item_groups(item.nodeid)
+            self.log_reports(item, reports)
+
+            if session.shouldfail:
+                raise session.Failed(session.shouldfail)
+            if session.shouldstop:
+                raise session.Interrupted(session.shouldstop)
+        except Exception as e:
+            logger.exception(e)
+            raise e
+        finally:
+            self.finish_task(item)
+
+    @staticmethod
+    def get_function_fixturedefs(item) -> list:
+        """
+        case用到的function作用域的fixturedef
+        """
+        fixturedefs = []
+        for defs in item._fixtureinfo.name2fixturedefs.values():
+            fixturedefs.extend(fixturedef for fixturedef in defs if fixturedef.scope == "function")
+        return fixturedefs
+
+    async def _call_async_item(self, item) -> TestReport:
+        """
+        await测试函数的协程，并按照pytest的call阶段生成报告
+
+        pytest_runtest_call无法await协程，这里直接await测试函数，记录时间线和捕获输出的run_phase同样作用于call阶段
+        """
+        _update_current_test_var(item, "call")
+        start = time.time()
+        error = None
+        with self.run_phase(item, "call"):
+            try:
+                testargs = {}
+                for arg in item._fixtureinfo.argnames:
+                    testargs[arg] = await self._resolve_async_fixture(item.funcargs[arg])
+                await item.obj(**testargs)
+            except (Exception, KeyboardInterrupt) as e:
+                error = e
+        stop = time.time()
+
+        def replay():
+            if error is not None:
+                raise error
+
+        # 用pytest的方式捕获异常，报告的耗时以实际await的时间为准
+        call = CallInfo.from_call(replay, "call")
+        call.start, call.stop, call.duration = start, stop, stop - start
+        return item.ihook.pytest_runtest_makereport(item=item, call=call)
+
+    async def _resolve_async_fixture(self, value):
+        """
+        async def定义的fixture的值是协程对象，在事件循环中await得到真正的值，fixture被多个case共享时只await一次
+        """
+        import asyncio
+
+        if not inspect.iscoroutine(value):
+            return value
+        future = self.async_fixture_results.get(value)
+        if future is None:
+            future = self.async_fixture_results[value] = asyncio.ensure_future(value)
+        return await asyncio.shield(future)
+
+    def start_event_loop(self):
+        """
+        启动运行协程case的事件循环线程
+        """
+        import asyncio
+
+        self.loop = asyncio.new_event_loop()
+        started = threading.Event()
+
+        def run():
+            asyncio.set_event_loop(self.loop)
+            self.loop.call_soon(started.set)
+            self.loop.run_forever()
+
+        self.loop_thread = threading.Thread(target=run, name="pytest-groups-asyncio", daemon=True)
+        self.loop_thread.start()
+        started.wait()
+
+    def stop_event_loop(self):
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self.loop_thread.join()
+        self.loop.close()
+
+    def finish_task(self, item):
+        """
+        任务运行结束，释放任务占用的线程、分组和资源
+        """
+        with self.condition:
+            if item not in self.tasks:
+                # 超时的case已经被watchdog释放
+                return
+            if self.tracer:
+                self.tracer.complete("test", item.nodeid, self.task_started.pop(item))
+            del self.tasks[item]
+            # 释放之前线程池中运行的case数量：当前case占用的线程刚刚空出来，线程池满载时仍然需要扩容
+            thread_running = self.lane_running.get("thread", 0)
+            if self.lane_release.pop(item, True):
+                self.lane_running[self.get_task_lane(item)] -= 1
+            self.release_task_groups(item)
+            self.release_task_resources(item)
+            if self.max_open_scopes:
+                self.close_task_scopes(item)
+            if self.autoscaler and "thread" in self.lane_capacity:
+                self.lane_capacity["thread"] = self.autoscaler.adjust(
+                    thread_running, len(self.ready) + len(self.local_ready))
+            # 释放了线程和分组占用，唤醒调度线程
+            self.condition.notify_all()
+
+    def get_task_lane(self, task):
+        """
+        任务在线程池还是worker进程池中运行
+        :return: thread|process|async
+        """
+        if task in self.process_items:
+            return "process"
+        if task in self.async_items:
+            return "async"
+        return "thread"
 
     # def check_all_in_group(self, performing, items):
     #     """
@@ -397,7 +1662,17 @@ class GroupRunner(object):
 
     @pytest.mark.tryfirst
     def pytest_runtestloop(self, session):
-        print(f'pytest-group: 线程数({self.thread_count})')
+        self.parallel = not is_gil_enabled()
+        mode = "，无GIL并行" if self.parallel else ""
+        if self.autoscaler:
+            self.autoscaler.parallel = self.parallel
+            print(f'pytest-group: 线程数({self.autoscaler.minimum}~{self.thread_count}{mode})')
+        else:
+            print(f'pytest-group: 线程数({self.thread_count}{mode})')
+        if is_free_threaded_build() and not self.parallel:
+            # 导入的C扩展不支持free-threading时，解释器重新启用了GIL
+            print('pytest-group: 解释器为free-threaded构建，但GIL已被导入的扩展模块重新启用，线程不会并行运行case')
+        logger.info("运行模式", threads=self.thread_count, parallel=self.parallel)
 
         if session.testsfailed and not session.config.option.continue_on_collection_errors:
             raise session.Interrupted(
@@ -408,30 +1683,162 @@ class GroupRunner(object):
         if session.config.option.collectonly:
             return True
 
-        self.group_tasks = self.item_dict.values()
-        with ThreadPoolExecutor(max_workers=self.thread_count) as executor:
-            self.items = items = [i for i in session.items]
-            next_task = None
-            for i in range(len(items)):
-                while True:
-                    # 尝试遍历全部任务，找到一个可运行的任务
-                    for item in items:
-                        # 检查任务是否没有冲突，可运行
-                        if self.check_task_permission(item):
-                            next_task = item
-                            break
-                        else:
-                            next_task = None
-
-                    # 执行任务，或短暂等待后重新搜索不冲突的任务
-                    if next_task:
-                        self.add_exec_tasks(executor, session, next_task)
-                        break
-                    else:
-                        # 如果找不到可以运行的任务，就先稍等一下
-                        time.sleep(0.1)
+        # watchdog线程报告超时的case时，线程池中可能同时有case在运行，超时的case所在线程被放弃后也可能仍在运行，
+        # 同样需要由单独的线程输出报告、按线程捕获输出
+        watchdog = bool(self.timeout or self.item_timeouts)
+        if self.thread_count > 1 or self.process_items or self.async_items or watchdog:
+            self.start_reporter()
+        if (self.thread_count > 1 or self.async_items or watchdog) and \
+                session.config.getoption("capture", "no") != "no":
+            from .capture import ThreadCapture
+            self.thread_capture = ThreadCapture(session.config)
+
+        if self.process_items:
+            print(f'pytest-group: worker进程数({self.process_count + self.remote_workers})')
+            report_calls = self.put_worker_reports if self.reporter else None
+            if self.listen:
+                self.worker_pool = WorkerPool(session.config, self.process_count, parse_address(self.listen),
+                                              self.authkey, self.remote_workers, report_calls)
+            else:
+                self.worker_pool = WorkerPool(session.config, self.process_count, report_calls=report_calls)
+            self.worker_pool.start()
+
+        if self.async_items:
+            print(f'pytest-group: 协程并发数({self.async_concurrency})')
+            self.start_event_loop()
+
+        if watchdog:
+            self.watchdog = threading.Thread(target=self.watchdog_loop, name="pytest-groups-watchdog", daemon=True)
+            self.watchdog.start()
+
+        if self.thread_capture:
+            self.thread_capture.install()
+
+        from concurrent.futures.thread import ThreadPoolExecutor
+        executor = self.executor = ThreadPoolExecutor(max_workers=self.thread_count)
+        try:
+            while self.dispatch_count < len(session.items):
+                start = self.tracer.now() if self.tracer else None
+                with self.condition:
+                    # 阻塞等待，直到有空闲线程且有可运行的任务；任务完成时会被唤醒重新检查
+                    next_task = self.condition.wait_for(
+                        lambda: self.should_stop(session) or self.find_next_task())
+                    if start is not None:
+                        self.tracer.scheduler_blocked(start, self.tracer.now(), self.blocked_reasons)
+                        self.blocked_reasons = ()
+                # -x/--maxfail、--group-failfast=session等要求停止时不再调度新的任务
+                if self.should_stop(session):
+                    break
+                self.add_exec_tasks(executor, session, next_task)
+
+            # 等待worker进程、事件循环中的任务也全部完成
+            with self.condition:
+                self.condition.wait_for(lambda: not self.tasks)
+        finally:
+            # 超时被放弃的case所在线程可能一直不会结束，不等待线程池中的线程退出
+            executor.shutdown(wait=not self.abandoned)
+            self.watchdog_stop.set()
+            if self.worker_pool:
+                self.worker_pool.shutdown()
+            if self.loop:
+                self.stop_event_loop()
+            if self.reporter:
+                self.reporter.close()
+            if self.thread_capture:
+                self.thread_capture.uninstall()
+        if session.shouldfail:
+            raise session.Failed(session.shouldfail)
+        if session.shouldstop:
+            raise session.Interrupted(session.shouldstop)
         return True
 
+    @staticmethod
+    def should_stop(session) -> bool:
+        return bool(session.shouldfail or session.shouldstop)
+
+    def find_next_task(self):
+        """
+        从就绪队列中取出一个可以立即运行的任务，调用方需要持有self.condition
+
+        :return: 可运行的任务，没有空闲线程或全部任务都有冲突时返回None
+        """
+        if all(self.lane_running[lane] >= capacity for lane, capacity in self.lane_capacity.items()):
+            return None
+
+        if self.max_open_scopes:
+            # 优先调度所在作用域已经打开的任务，其次才是需要打开新作用域的任务
+            next_task, blocked = self._pop_runnable_task(self.local_ready)
+            if next_task is None:
+                next_task, blocked = self._pop_runnable_task(self.ready, blocked, self.can_open_scopes)
+        else:
+            next_task, blocked = self._pop_runnable_task(self.ready)
+
+        if next_task is None and self.tracer:
+            self.blocked_reasons = self.get_blocking_reasons(blocked)
+        return next_task
+
+    def _pop_runnable_task(self, ready, blocked=None, accept=None):
+        """
+        按照优先级从就绪队列中取出一个可以运行的任务，暂时不能运行的任务会被放回就绪队列
+
+        :param ready: 就绪队列
+        :param blocked: 已经检查过的不能运行的任务，用于统计阻塞原因
+        :param accept: 额外的检查条件
+        :return: tuple(可运行的任务或None, 不能运行的任务)
+        """
+        next_task = None
+        skipped = []
+        while ready:
+            entry = heapq.heappop(ready)
+            task = self.items[entry[1]]
+            if self.dispatched[entry[1]]:
+                # 已经从另一个就绪队列调度了
+                continue
+            # 检查任务所在的线程池/worker进程池是否有空闲，任务是否没有冲突，可运行
+            lane = self.get_task_lane(task)
+            if self.lane_running[lane] < self.lane_capacity[lane] and self.check_task_permission(task) and \
+                    (accept is None or accept(task)):
+                next_task = task
+                break
+            skipped.append(entry)
+
+        # 暂时不能运行的任务放回就绪队列
+        for entry in skipped:
+            heapq.heappush(ready, entry)
+        return next_task, (blocked or []) + skipped
+
+    def get_blocking_reasons(self, blocked) -> tuple:
+        """
+        有空闲线程但没有任务可以运行时，统计阻塞调度的分组、资源，仅在记录时间线时使用，调用方需要持有self.lock
+
+        :param blocked: 就绪队列中因为冲突暂时不能运行的任务
+        :return: tuple(阻塞原因)
+        """
+        reasons = set()
+        for _, i in blocked:
+            task = self.items[i]
+            lane = self.get_task_lane(task)
+            if self.lane_running[lane] >= self.lane_capacity[lane]:
+                continue
+            reasons.update(f"resource:{name}" for name in self._iter_blocking_resources(task))
+            if self.max_open_scopes and not self.can_open_scopes(task):
+                reasons.add(MAX_OPEN_SCOPES)
+        # 正在运行的任务所在的分组中还有等待的后继任务
+        for task in self.tasks:
+            for gid, slot in self.iter_item_groups(self.item_index[task]):
+                if slot + 1 < self.group_start[gid + 1]:
+                    reasons.add(f"group:{self.get_group_name(gid)}")
+        return tuple(sorted(reasons))
+
+    def get_group_name(self, gid) -> str:
+        """
+        分组的可读名称，自动分组的key为module、class或case对象
+        """
+        key = self.group_keys[gid]
+        if isinstance(key, Item):
+            return key.nodeid
+        return getattr(key, "__qualname__", None) or getattr(key, "__name__", None) or str(key)
+
     def check_task_permission(self, next_task):
         """
         检查任务是否可执行，确保任务不会因为业务逻辑冲突与其他任务发生互斥
@@ -448,22 +1855,87 @@ class GroupRunner(object):
         :param task:
         :return: True|False,不接受并发的任务为True
         """
-        notconcurrent = self.is_notconcurrent.get(task)
-        if not notconcurrent:
-            notconcurrent = task.get_closest_marker(NOTCONCURRENT)
-            notconcurrent = notconcurrent is not None
-        self.is_notconcurrent[task] = notconcurrent
-        return notconcurrent
+        return bool(self.notconcurrent[self.item_index[task]])
+
+    @staticmethod
+    def get_item_resources(item) -> Tuple[Tuple[str, int, bool], ...]:
+        """
+        读取@pytest.mark.resource声明的资源，类、模块上声明的资源会累加到case上
+
+        :param item:
+        :return: tuple((资源名称, 最大同时占用数量, 是否为共享占用))
+        """
+        resources = {}
+        for marker in item.iter_markers(RESOURCE):
+            capacity = int(marker.kwargs.get("max", 1))
+            if capacity < 1:
+                raise pytest.UsageError(f"{item.nodeid}: @pytest.mark.{RESOURCE}的max参数必须大于0，实际为{capacity}")
+            shared = bool(marker.kwargs.get("shared", False))
+            for name in marker.args:
+                # 离case最近的声明优先生效
+                resources.setdefault(name, (name, capacity, shared))
+        return tuple(resources.values())
+
+    @staticmethod
+    def check_resource_capacity(item, resources, resource_capacity):
+        """
+        同一个资源只能声明一个max：调度时按照资源记录独占数量，各case声明不同的max时无法确定资源的容量
+
+        :param item:
+        :param resources: case声明的资源
+        :param resource_capacity: 已经声明的资源容量，{资源名称: (最大同时占用数量, 声明的case)}
+        """
+        for name, capacity, shared in resources:
+            if shared:
+                # 共享占用不受max限制
+                continue
+            declared, owner = resource_capacity.setdefault(name, (capacity, item))
+            if declared != capacity:
+                raise pytest.UsageError(f"{item.nodeid}: @pytest.mark.{RESOURCE}('{name}')声明的max={capacity}"
+                                        f"与{owner.nodeid}声明的max={declared}冲突，同一个资源只能声明相同的max")
 
     def _check_task_resource_permission(self, next_task):
         """
         检查任务是否有会与正在执行的任务的任务组是否存在使用相同的但不可共享的资源
 
+        独占的资源在没有共享占用者且独占数量未达到max时可以被占用，共享的资源在没有独占占用者时可以被占用
+
         :param next_task:  计划下一个要运行的任务
         :return:  True|False,无冲突时为True
         """
+        for _ in self._iter_blocking_resources(next_task):
+            return False
         return True
-        # 暂未实现
+
+    def _iter_blocking_resources(self, task):
+        """
+        遍历任务声明的资源中当前无法被占用的资源名称
+        """
+        for name, capacity, shared in self.item_resources.get(task, ()):
+            if self.resource_exclusive[name] >= (1 if shared else capacity):
+                yield name
+            elif not shared and self.resource_shared[name]:
+                yield name
+
+    def acquire_task_resources(self, task):
+        """
+        占用任务声明的资源，调用方需要持有self.lock
+        """
+        for name, _, shared in self.item_resources.get(task, ()):
+            if shared:
+                self.resource_shared[name] += 1
+            else:
+                self.resource_exclusive[name] += 1
+
+    def release_task_resources(self, task):
+        """
+        释放任务占用的资源，调用方需要持有self.lock
+        """
+        for name, _, shared in self.item_resources.get(task, ()):
+            if shared:
+                self.resource_shared[name] -= 1
+            else:
+                self.resource_exclusive[name] -= 1
 
     def _check_task_group_permission(self, next_task):
         """
@@ -472,30 +1944,11 @@ class GroupRunner(object):
         :param next_task:  计划下一个要运行的任务
         :return:  True|False,无冲突时为True
         """
-        # 检查计划运行的任务item在各个任务组中的索引，如果索引为-1即不存在于任务组中
-        plan_task_exists = self.item_map_exist.setdefault(next_task, [])
-        if len(plan_task_exists) == 0:
-            for group_task in self.group_tasks:
-                try:
-                    _ = group_task.index(next_task)
-                    plan_task_exists.append(_)
-                except ValueError as e:
-                    plan_task_exists.append(-1)
-
-        # 遍历当前正在运行的任务performing_task，检查与当前计划运行的任务item是否冲突
-        # 如果有冲突，说明当前任务不能执行
-        with self.lock:
-            for performing_task in self.tasks:
-                performing_task_exists = self.item_map_exist.setdefault(performing_task, [])
-                for i in range(len(performing_task_exists)):
-                    # 检查与当前计划运行的任务item是否冲突
-                    plan_exists = plan_task_exists[i]
-                    performing_exists = performing_task_exists[i]
-                    if plan_exists == -1 or performing_exists == -1 or plan_exists < performing_exists:
-                        continue
-                    return False
-
-            return True
+        # 任务在所属的每个分组中都必须轮到自己，即分组内排在前面的任务都已经执行完成
+        for gid, slot in self.iter_item_groups(self.item_index[next_task]):
+            if self.group_cursor[gid] != slot:
+                return False
+        return True
 
     def add_exec_tasks(self, executor, session, next_task):
         """
@@ -505,22 +1958,52 @@ class GroupRunner(object):
         """
 
         def run_generic_task():
+            task = self.task_order[self.task_index]
+            skip_reason = self.get_skip_reason(task)
+            batch = [task]
+            if not skip_reason and task in self.process_items and not self.is_notconcurrent_task(task):
+                batch = self.lease_group_prefix(task)
+            if self.tracer:
+                self.tracer.instant("dispatch", task.nodeid)
             with self.lock:
-                self.items.remove(next_task)
-                self.tasks.append(next_task)
-            executor.submit(self.run_one_test_item, self, session, self.task_order[self.task_index],
-                            None)
+                if self.tracer:
+                    for t in batch:
+                        self.task_started[t] = self.tracer.now()
+                self.tasks.update(dict.fromkeys(batch))
+                self.lane_running[self.get_task_lane(task)] += 1
+                self.acquire_task_resources(task)
+                # 同一批case占用同一个worker进程，最后一个case运行完成时才释放
+                for t in batch[:-1]:
+                    self.lane_release[t] = False
+                self.leased.update(batch[1:])
+                if self.max_open_scopes:
+                    for t in batch:
+                        self.open_task_scopes(t)
+            self.dispatch_count += len(batch)
+            if skip_reason:
+                # 分组中已经有case失败，在调度线程中直接跳过
+                self.skip_one_item(task, skip_reason)
+            elif task in self.process_items:
+                self.worker_pool.executor.submit(self.run_one_process_item, session, batch)
+            elif task in self.async_items:
+                import asyncio
+                asyncio.run_coroutine_threadsafe(self.run_async_item(session, task), self.loop)
+            else:
+                executor.submit(self.run_one_test_item, self, session, task, None)
             self.task_index += 1
 
         def run_notconcurrent_task():
             # 等待到任务队列中的任务全部执行完毕，再将notconcurrent任务启动,并等待notconcurrent任务运行完成
-            while 1 < len(self.tasks):
-                time.sleep(0.1)
+            start = self.tracer.now() if self.tracer else None
+            with self.condition:
+                self.condition.wait_for(lambda: not self.tasks)
 
             run_generic_task()
 
-            while 1 < len(self.tasks):
-                time.sleep(0.1)
+            with self.condition:
+                self.condition.wait_for(lambda: not self.tasks)
+            if start is not None:
+                self.tracer.scheduler_blocked(start, self.tracer.now(), (f"notconcurrent:{next_task.nodeid}",))
 
         self.task_order.append(next_task)
 
@@ -531,6 +2014,33 @@ class GroupRunner(object):
             # 否则就是一个普通的任务，正常的执行就可以
             return run_generic_task()
 
+    def lease_group_prefix(self, task):
+        """
+        从任务开始，取出同一分组内后续连续的case，一起分配给同一个worker进程按顺序运行，减少调度进程与worker进程的交互
+
+        只有仅属于这一个分组、没有声明资源、不是notconcurrent的后继case才会被一起分配，
+        这样后继case只依赖前一个case运行完成，在同一个worker进程中按顺序运行即可保证分组内的顺序
+
+        :param task: 已经可以运行的任务
+        :return: list，按顺序运行的一组case
+        """
+        batch = [task]
+        i = self.item_index[task]
+        while len(batch) < self.lease_size:
+            k = self.item_group_start[i]
+            if self.item_group_start[i + 1] - k != 1:
+                break
+            gid, slot = self.item_group_ids[k], self.item_group_slots[k]
+            if slot + 1 >= self.group_start[gid + 1]:
+                break
+            i = self.group_members[slot + 1]
+            successor = self.items[i]
+            if successor not in self.process_items or self.item_group_start[i + 1] - self.item_group_start[i] != 1 or \
+                    successor in self.item_resources or self.notconcurrent[i]:
+                break
+            batch.append(successor)
+        return batch
+
     def _gener_item_group_key(self, item, group_unit, groups=None) -> list:
         """
         计算出item所属分组的key
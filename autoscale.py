@@ -0,0 +1,116 @@
+"""
+线程池容量的自动伸缩
+
+根据case运行时等待IO的时间占比、就绪队列中积压的任务数量以及进程的cpu使用率，在[最小值, 最大值]之间调整同时运行的case数量
+"""
+import os
+import threading
+import time
+
+import pytest
+
+
+def parse_thread_range(value):
+    """
+    解析--thread的取值
+
+    :param value: 整数、auto或min:max
+    :return: tuple(最小线程数, 最大线程数)，两者相同时为固定线程数
+    """
+    value = str(value).strip()
+    if value == "auto":
+        cpu = os.cpu_count() or 1
+        return cpu, cpu * 4
+    try:
+        if ":" in value:
+            minimum, maximum = (int(v) for v in value.split(":", 1))
+        else:
+            minimum = maximum = int(value)
+    except ValueError:
+        raise pytest.UsageError(f"--thread的取值{value}不合法，格式为整数、auto或min:max") from None
+    if minimum < 1 or maximum < minimum:
+        raise pytest.UsageError(f"--thread的取值{value}不合法，需要满足1 <= min <= max")
+    return minimum, maximum
+
+
+class ThreadAutoscaler(object):
+    """
+    定期根据观测到的运行情况调整线程池的容量
+
+    * 进程cpu使用率超过限制时缩容
+    * 线程池已满、就绪队列中有积压，并且case大部分时间在等待IO时扩容
+    * case大部分时间在占用cpu时缩容，避免线程之间争抢GIL；没有GIL时线程可以并行，cpu密集的case扩容到cpu核数，超过cpu核数时才缩容
+    """
+
+    def __init__(self, minimum, maximum, cpu_limit=None, interval=0.5, parallel=False):
+        self.minimum = minimum
+        self.maximum = maximum
+        # 解释器没有启用GIL，线程可以在多个cpu核上并行运行
+        self.parallel = parallel
+        # 进程cpu使用率的上限，为全部cpu核的百分比
+        self.cpu_limit = cpu_limit
+        self.interval = interval
+        self.capacity = minimum
+        self.lock = threading.Lock()
+        self.start = time.perf_counter()
+        self.last = self.start
+        self.last_cpu = time.process_time()
+        # 统计周期内case运行的总耗时、占用cpu的总耗时
+        self.wall = 0.0
+        self.cpu = 0.0
+        # (运行时间, 容量)的变化记录
+        self.history = [(0.0, self.capacity)]
+
+    def record(self, wall, cpu):
+        """
+        记录一个case的运行耗时和其中占用cpu的耗时
+        """
+        with self.lock:
+            self.wall += wall
+            self.cpu += cpu
+
+    def adjust(self, running, backlog) -> int:
+        """
+        到达统计周期时重新计算容量
+
+        :param running: 正在运行的case数量
+        :param backlog: 就绪队列中等待的任务数量
+        :return: 调整后的容量
+        """
+        now = time.perf_counter()
+        if now - self.last < self.interval:
+            return self.capacity
+
+        with self.lock:
+            wall, cpu = self.wall, self.cpu
+            self.wall = self.cpu = 0.0
+        process_cpu = time.process_time()
+        cpu_usage = (process_cpu - self.last_cpu) / ((now - self.last) * (os.cpu_count() or 1)) * 100
+        self.last, self.last_cpu = now, process_cpu
+        wait_ratio = 1 - cpu / wall if wall > 0 else 0.0
+
+        capacity = self.capacity
+        if self.cpu_limit and cpu_usage > self.cpu_limit:
+            capacity -= 1
+        elif running >= capacity and backlog and wait_ratio > 0.5:
+            capacity += max(1, capacity // 4)
+        elif wall > 0 and wait_ratio < 0.2:
+            cores = os.cpu_count() or 1
+            if not self.parallel or capacity > cores:
+                capacity -= 1
+            elif running >= capacity and backlog and capacity < cores:
+                capacity += 1
+        capacity = max(self.minimum, min(self.maximum, capacity))
+
+        if capacity != self.capacity:
+            self.capacity = capacity
+            self.history.append((round(now - self.start, 3), capacity))
+        return self.capacity
+
+    def summary(self) -> list:
+        """
+        线程池容量的变化记录
+        """
+        lines = [f"threads: min={self.minimum}, max={self.maximum}, final={self.capacity}"]
+        lines.extend(f"  {t:10.3f}s  {capacity}" for t, capacity in self.history)
+        return lines
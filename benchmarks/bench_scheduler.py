@@ -0,0 +1,259 @@
+"""
+调度器和fixture共享机制的基准测试
+
+生成合成的测试目录(大量module、多层class嵌套、互相重叠的@pytest.mark.group分组、notconcurrent/resource标签、
+用sleep模拟IO的case)，以不同的--thread运行，统计每个case的调度开销、相对理想耗时的效率以及内存峰值，结果输出为json，
+用于对比不同版本之间的性能变化。运行耗时由生成的conftest.py在pytest进程内统计pytest_runtestloop的耗时，不包括解释器启动和收集case。
+
+用法：
+    python benchmarks/bench_scheduler.py --threads 1 4 16 --output result.json
+    python benchmarks/bench_scheduler.py --threads 4 --compare old.json --output new.json
+"""
+import argparse
+import json
+import os
+import platform
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from collections import namedtuple
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+PLUGIN_NAME = "pytest_groups"
+
+SCENARIOS = ("modules", "nested", "overlap", "markers", "overhead")
+
+# 一次pytest运行的结果：耗时秒数、子进程内存峰值KB、返回码、输出
+RunResult = namedtuple("RunResult", ["wall", "rss", "returncode", "output"])
+
+# 生成的conftest.py把pytest_runtestloop的耗时写入这个环境变量指定的文件
+RUNLOOP_ENV = "PYTEST_GROUPS_BENCH_RUNLOOP"
+
+CONFTEST = f"""import os
+import time
+
+import pytest
+
+
+@pytest.fixture(scope="session")
+def session_value():
+    return 1
+
+
+@pytest.hookimpl(hookwrapper=True)
+def pytest_runtestloop(session):
+    start = time.perf_counter()
+    yield
+    path = os.environ.get("{RUNLOOP_ENV}")
+    if path:
+        with open(path, "w") as f:
+            f.write(repr(time.perf_counter() - start))
+"""
+
+
+def copy_plugin(target):
+    """
+    将插件复制到临时目录中作为pytest_groups包，通过-p pytest_groups加载
+    """
+    shutil.copytree(ROOT, os.path.join(target, PLUGIN_NAME),
+                    ignore=shutil.ignore_patterns(".git", "benchmarks", "tests", "__pycache__", ".pytest_cache", "*.log"))
+
+
+def generate(scenario, path, modules, tests, sleep):
+    """
+    生成合成的测试目录
+
+    :param scenario: 场景名称
+    :param path: 测试目录
+    :param modules: module数量
+    :param tests: 每个module中的case数量
+    :param sleep: 每个case的sleep时长(秒)
+    :return: dict，case总数、sleep总时长、理想耗时的计算依据
+    """
+    os.makedirs(path)
+    serial = 0.0
+    total = 0.0
+    chains = {}
+    count = 0
+    for m in range(modules):
+        lines = ["import time", "import pytest", "", ""]
+        if scenario == "modules":
+            # 默认按照module分组，module内的case顺序运行
+            for t in range(tests):
+                lines += [f"def test_{t}():", f"    time.sleep({sleep})", "", ""]
+            chains[f"m{m}"] = tests * sleep
+        elif scenario == "nested":
+            # 多层class嵌套，按照class分组
+            depth = 4
+            indent = ""
+            for d in range(depth):
+                lines.append(f"{indent}class TestLevel{d}:")
+                indent += "    "
+            for t in range(tests):
+                lines += [f"{indent}def test_{t}(self):", f"{indent}    time.sleep({sleep})", ""]
+            chains[f"m{m}"] = tests * sleep
+        elif scenario == "overlap":
+            # 每个case属于两个互相重叠的分组
+            for t in range(tests):
+                a, b = (m + t) % 7, (m * t) % 11
+                lines += [f"@pytest.mark.group('a{a}', 'b{b}')", f"def test_{t}():", f"    time.sleep({sleep})", "", ""]
+                chains[f"a{a}"] = chains.get(f"a{a}", 0.0) + sleep
+                chains[f"b{b}"] = chains.get(f"b{b}", 0.0) + sleep
+        elif scenario == "markers":
+            # 不分组的case，混合notconcurrent和resource标签
+            lines.insert(2, "pytestmark = pytest.mark.group()")
+            for t in range(tests):
+                if t % 50 == 0:
+                    lines.append("@pytest.mark.notconcurrent")
+                    serial += sleep
+                elif t % 5 == 0:
+                    lines.append(f"@pytest.mark.resource('r{t % 3}')")
+                lines += [f"def test_{t}():", f"    time.sleep({sleep})", "", ""]
+        elif scenario == "overhead":
+            # 不sleep也不分组，只衡量调度本身的开销
+            lines.insert(2, "pytestmark = pytest.mark.group()")
+            for t in range(tests):
+                lines += [f"def test_{t}():", "    pass", "", ""]
+        count += tests
+        if scenario != "overhead":
+            total += tests * sleep
+        with open(os.path.join(path, f"test_m{m}.py"), "w") as f:
+            f.write("\n".join(lines))
+
+    with open(os.path.join(path, "conftest.py"), "w") as f:
+        f.write(CONFTEST)
+    return {"items": count, "total": total, "serial": serial,
+            "critical_path": max(chains.values()) if chains else 0.0}
+
+
+def ideal_time(info, threads):
+    """
+    理想耗时的下界：分组内的最长路径与(notconcurrent串行部分 + 其余部分平均分配到各线程)中的较大值
+    """
+    parallel = (info["total"] - info["serial"]) / threads
+    return max(info["critical_path"], info["serial"] + parallel)
+
+
+def run_pytest(cwd, args, extra_env=None):
+    """
+    在子进程中运行pytest
+
+    子进程的输出写入临时文件而不是管道，避免输出较多时阻塞子进程；用os.wait4等待子进程，同时取得这一次运行的内存峰值
+
+    :return: RunResult
+    """
+    env = dict(os.environ)
+    env["PYTHONPATH"] = cwd + os.pathsep + env.get("PYTHONPATH", "")
+    env.update(extra_env or {})
+    cmd = [sys.executable, "-m", "pytest", "-p", PLUGIN_NAME, "-p", "no:cacheprovider", "-q", *args]
+    with tempfile.TemporaryFile(mode="w+") as output:
+        start = time.perf_counter()
+        p = subprocess.Popen(cmd, cwd=cwd, env=env, stdout=output, stderr=subprocess.STDOUT)
+        _, status, rusage = os.wait4(p.pid, 0)
+        wall = time.perf_counter() - start
+        # 与Popen.returncode相同：正常退出时为退出码，被信号终止时为负的信号值
+        p.returncode = -os.WTERMSIG(status) if os.WIFSIGNALED(status) else os.WEXITSTATUS(status)
+        output.seek(0)
+        return RunResult(wall, rusage.ru_maxrss, p.returncode, output.read())
+
+
+def print_failure(cmd_args, code, output, lines=30):
+    """
+    子进程运行失败时输出返回码和最后几行输出
+    """
+    print(f"pytest {' '.join(cmd_args)} 返回码为{code}:", file=sys.stderr)
+    print("\n".join(output.splitlines()[-lines:]), file=sys.stderr)
+
+
+def bench(args):
+    results = []
+    with tempfile.TemporaryDirectory(prefix="pytest-groups-bench-") as tmp:
+        copy_plugin(tmp)
+        for scenario in args.scenarios:
+            path = os.path.join(tmp, f"bench_{scenario}")
+            info = generate(scenario, path, args.modules, args.tests, args.sleep)
+            group_unit = "class" if scenario == "nested" else "module"
+            runloop_path = os.path.join(tmp, "runloop.txt")
+
+            for threads in args.threads:
+                for _ in range(args.repeat):
+                    if os.path.exists(runloop_path):
+                        os.remove(runloop_path)
+                    run_args = [path, f"--thread={threads}", f"--group-unit={group_unit}"]
+                    wall, rss, code, output = run_pytest(tmp, run_args, {RUNLOOP_ENV: runloop_path})
+                    # pytest进程内统计的运行耗时，没有统计到时(如收集失败)按照失败处理
+                    run = None
+                    if os.path.exists(runloop_path):
+                        with open(runloop_path) as f:
+                            run = float(f.read())
+                    ideal = ideal_time(info, threads)
+                    failed = code != 0 or run is None
+                    if failed:
+                        print_failure(run_args, code, output)
+                    result = {
+                        "scenario": scenario,
+                        "threads": threads,
+                        "items": info["items"],
+                        "wall": round(wall, 4),
+                        "run": round(run, 4) if run is not None else None,
+                        "ideal": round(ideal, 4),
+                        # 运行失败时耗时不代表调度的性能，不计算效率
+                        "efficiency": round(ideal / run, 4) if run and ideal and not failed else None,
+                        "overhead_per_item_ms": None if failed else round((run - ideal) / info["items"] * 1000, 4),
+                        "peak_rss_kb": rss,
+                        "returncode": code,
+                        "failed": failed,
+                    }
+                    results.append(result)
+                    print(json.dumps(result, ensure_ascii=False))
+    return results
+
+
+def compare(results, baseline_path):
+    """
+    与之前保存的结果对比，按照场景和线程数输出运行耗时的变化
+    """
+    with open(baseline_path) as f:
+        baseline = {(r["scenario"], r["threads"]): r for r in json.load(f)["results"]}
+    print(f"{'scenario':<10} {'threads':>7} {'run(old)':>10} {'run(new)':>10} {'change':>8}")
+    for r in results:
+        old = baseline.get((r["scenario"], r["threads"]))
+        if not old or not old["run"] or old.get("failed") or r["failed"]:
+            continue
+        change = (r["run"] - old["run"]) / old["run"]
+        print(f"{r['scenario']:<10} {r['threads']:>7} {old['run']:>10.3f} {r['run']:>10.3f} {change:>+8.1%}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="pytest-groups调度器基准测试")
+    parser.add_argument("--scenarios", nargs="+", default=list(SCENARIOS), choices=SCENARIOS)
+    parser.add_argument("--threads", nargs="+", type=int, default=[1, 4, 16])
+    parser.add_argument("--modules", type=int, default=200, help="每个场景生成的module数量")
+    parser.add_argument("--tests", type=int, default=10, help="每个module中的case数量")
+    parser.add_argument("--sleep", type=float, default=0.005, help="每个case模拟IO的sleep时长(秒)")
+    parser.add_argument("--repeat", type=int, default=1)
+    parser.add_argument("--output", help="结果json文件路径")
+    parser.add_argument("--compare", help="之前保存的结果json文件，输出对比")
+    args = parser.parse_args()
+
+    results = bench(args)
+    data = {
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "timestamp": time.time(),
+        "args": vars(args),
+        "results": results,
+    }
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(data, f, indent=2, ensure_ascii=False)
+    if args.compare:
+        compare(results, args.compare)
+    if any(r["failed"] for r in results):
+        raise SystemExit("部分运行失败，对应结果的failed为true")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,111 @@
+"""
+插件导入耗时和os.environ访问开销的基准测试
+
+    * 导入耗时：在新的解释器中先导入pytest，再统计导入插件的耗时，以及插件额外导入的模块(如asyncio、multiprocessing)
+    * os.environ访问开销：分别对原始的os.environ和ThreadLocalEnviron统计常见操作每次调用的耗时
+
+用法：
+    python benchmarks/bench_startup.py --repeat 20 --output result.json
+"""
+import argparse
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import timeit
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from bench_scheduler import PLUGIN_NAME, copy_plugin  # noqa: E402
+
+IMPORT_SCRIPT = f"""
+import json, sys, time
+import pytest
+before = set(sys.modules)
+start = time.perf_counter()
+import {PLUGIN_NAME}
+elapsed = time.perf_counter() - start
+modules = sorted(m for m in set(sys.modules) - before if not m.startswith("{PLUGIN_NAME}"))
+print(json.dumps({{"elapsed": elapsed, "modules": modules}}))
+"""
+
+# 统计的os.environ操作，(名称, 语句)
+ENVIRON_OPS = (
+    ("getitem", "env['PATH']"),
+    ("get_missing", "env.get('PYTEST_GROUPS_BENCH_MISSING')"),
+    ("contains", "'HOME' in env"),
+    ("set_del_current_test", "env['PYTEST_CURRENT_TEST'] = 'x.py::test (call)'; del env['PYTEST_CURRENT_TEST']"),
+    ("len", "len(env)"),
+    ("copy", "dict(env)"),
+)
+
+
+def bench_import(cwd, repeat):
+    env = dict(os.environ)
+    env["PYTHONPATH"] = cwd + os.pathsep + env.get("PYTHONPATH", "")
+    timings = []
+    modules = []
+    for _ in range(repeat):
+        out = subprocess.run([sys.executable, "-c", IMPORT_SCRIPT], cwd=cwd, env=env, capture_output=True, text=True,
+                             check=True)
+        data = json.loads(out.stdout)
+        timings.append(data["elapsed"])
+        modules = data["modules"]
+    return {
+        "import_ms_median": round(statistics.median(timings) * 1000, 3),
+        "import_ms_min": round(min(timings) * 1000, 3),
+        "extra_modules": len(modules),
+        "heavy_modules": [m for m in modules if m.split(".")[0] in ("asyncio", "multiprocessing", "concurrent", "ssl")],
+    }
+
+
+def bench_environ(number):
+    from pytest_groups import ThreadLocalEnviron
+
+    results = []
+    plain = os.environ
+    wrapped = ThreadLocalEnviron(os.environ)
+    for name, stmt in ENVIRON_OPS:
+        row = {"op": name}
+        for label, env in (("os_environ", plain), ("thread_local", wrapped)):
+            t = min(timeit.repeat(stmt, globals={"env": env}, number=number, repeat=5))
+            row[f"{label}_ns"] = round(t / number * 1e9, 1)
+        row["overhead"] = round(row["thread_local_ns"] / row["os_environ_ns"], 3) if row["os_environ_ns"] else None
+        results.append(row)
+        print(json.dumps(row, ensure_ascii=False))
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="pytest-groups导入耗时和os.environ访问开销基准测试")
+    parser.add_argument("--repeat", type=int, default=10, help="测量导入耗时的次数")
+    parser.add_argument("--number", type=int, default=100000, help="每个os.environ操作的调用次数")
+    parser.add_argument("--output", help="结果json文件路径")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory(prefix="pytest-groups-bench-") as tmp:
+        copy_plugin(tmp)
+        startup = bench_import(tmp, args.repeat)
+        print(json.dumps(startup, ensure_ascii=False))
+        sys.path.insert(0, tmp)
+        environ = bench_environ(args.number)
+
+    data = {
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "timestamp": time.time(),
+        "args": vars(args),
+        "import": startup,
+        "environ": environ,
+    }
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(data, f, indent=2, ensure_ascii=False)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,187 @@
+"""
+线程上下文初始化(init_thread_env)的微基准测试
+
+不运行pytest，直接构造作用域链和线程私有的fixturedef，多个线程反复初始化运行case的上下文，
+同时由一个线程不断发布新的fixture执行结果，统计每次初始化的耗时分布。对比两种实现：
+    lock: 初始化和发布都持有调度器的全局锁，发布时直接修改作用域的执行结果(之前的实现)
+    snapshot: 发布时复制作用域的执行结果后整体替换，初始化时不加锁读取(当前的实现)
+
+用法：
+    python benchmarks/bench_thread_env.py --threads 1 4 16 --output result.json
+"""
+import argparse
+import json
+import os
+import platform
+import sys
+import tempfile
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from bench_scheduler import copy_plugin  # noqa: E402
+
+MODES = ("lock", "snapshot")
+
+
+class Node(object):
+    """
+    模拟session、module、class等作用域节点
+    """
+
+    def __init__(self, name):
+        self.name = name
+
+
+class LocalFixtureDef(threading.local):
+    """
+    与ThreadLocalFixtureDef一样，执行结果和终结器是线程私有的
+    """
+
+    def __init__(self):
+        self._finalizers = []
+        self.cached_result = None
+
+
+class Item(object):
+    def __init__(self, chain, session):
+        self.chain = chain
+        self.session = session
+
+    def listchain(self):
+        return self.chain
+
+
+class Runner(object):
+    """
+    只包含init_thread_env、publish_fixture_result需要的调度器状态
+    """
+
+    def __init__(self):
+        self.lock = threading.RLock()
+        self.stack_map_fuxturedef = {}
+
+
+def build(depth, fixtures, items):
+    """
+    构造作用域链和fixture，每个case的作用域链为session -> module -> 多层class -> case
+
+    :return: tuple(case列表, list((作用域, fixturedef)))
+    """
+    session = Node("session")
+    session._setupstate = threading.local()
+    scopes = [session] + [Node(f"scope{d}") for d in range(depth)]
+    defs = [(scopes[i % len(scopes)], LocalFixtureDef()) for i in range(fixtures)]
+    return [Item(scopes + [Node(f"item{i}")], session) for i in range(items)], defs
+
+
+def publish_locked(runner, scope, fixturedef):
+    with runner.lock:
+        runner.stack_map_fuxturedef.setdefault(scope, {})[fixturedef] = (
+            fixturedef._finalizers, fixturedef.cached_result)
+
+
+def bench_one(mode, threads, args):
+    from pytest_groups import GroupRunner
+
+    runner = Runner()
+    items, defs = build(args.depth, args.fixtures, args.items)
+    init_thread_env = GroupRunner.init_thread_env
+    publish_fixture_result = GroupRunner.publish_fixture_result
+    for scope, fixturedef in defs:
+        fixturedef.cached_result = (0, None, None)
+        publish_fixture_result(runner, scope, fixturedef)
+
+    stop = threading.Event()
+    barrier = threading.Barrier(threads + 1)
+    samples = [[] for _ in range(threads)]
+
+    def writer():
+        # 模拟其他线程不断执行完fixture，发布新的执行结果
+        n = 0
+        while not stop.is_set():
+            scope, fixturedef = defs[n % len(defs)]
+            fixturedef.cached_result = (n, None, None)
+            if mode == "lock":
+                publish_locked(runner, scope, fixturedef)
+            else:
+                publish_fixture_result(runner, scope, fixturedef)
+            n += 1
+            time.sleep(args.publish_interval)
+
+    def reader(index):
+        timings = samples[index]
+        barrier.wait()
+        for n in range(args.iterations):
+            item = items[(n + index) % len(items)]
+            start = time.perf_counter_ns()
+            if mode == "lock":
+                with runner.lock:
+                    init_thread_env(runner, item)
+            else:
+                init_thread_env(runner, item)
+            timings.append(time.perf_counter_ns() - start)
+
+    w = threading.Thread(target=writer, daemon=True)
+    w.start()
+    workers = [threading.Thread(target=reader, args=(i,)) for i in range(threads)]
+    for t in workers:
+        t.start()
+    barrier.wait()
+    start = time.perf_counter()
+    for t in workers:
+        t.join()
+    wall = time.perf_counter() - start
+    stop.set()
+    w.join()
+
+    timings = sorted(x for s in samples for x in s)
+    return {
+        "mode": mode,
+        "threads": threads,
+        "calls": len(timings),
+        "wall": round(wall, 4),
+        "calls_per_sec": round(len(timings) / wall, 1) if wall else None,
+        "p50_us": round(timings[len(timings) // 2] / 1000, 3),
+        "p99_us": round(timings[min(len(timings) - 1, len(timings) * 99 // 100)] / 1000, 3),
+        "max_us": round(timings[-1] / 1000, 3),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="pytest-groups线程上下文初始化基准测试")
+    parser.add_argument("--modes", nargs="+", default=list(MODES), choices=MODES)
+    parser.add_argument("--threads", nargs="+", type=int, default=[1, 4, 16])
+    parser.add_argument("--depth", type=int, default=4, help="case所在作用域链的层数(不含session)")
+    parser.add_argument("--fixtures", type=int, default=40, help="各作用域下共享的fixture总数")
+    parser.add_argument("--items", type=int, default=1000)
+    parser.add_argument("--iterations", type=int, default=20000, help="每个线程初始化上下文的次数")
+    parser.add_argument("--publish-interval", type=float, default=0.0001, help="发布执行结果的间隔(秒)")
+    parser.add_argument("--output", help="结果json文件路径")
+    args = parser.parse_args()
+
+    results = []
+    with tempfile.TemporaryDirectory(prefix="pytest-groups-bench-") as tmp:
+        copy_plugin(tmp)
+        sys.path.insert(0, tmp)
+        for threads in args.threads:
+            for mode in args.modes:
+                result = bench_one(mode, threads, args)
+                results.append(result)
+                print(json.dumps(result, ensure_ascii=False))
+
+    data = {
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "timestamp": time.time(),
+        "args": vars(args),
+        "results": results,
+    }
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(data, f, indent=2, ensure_ascii=False)
+
+
+if __name__ == "__main__":
+    main()
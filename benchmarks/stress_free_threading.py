@@ -0,0 +1,237 @@
+"""
+线程池调度和fixture共享机制的压力测试，用于在free-threaded(无GIL)解释器下验证线程安全
+
+生成合成的测试目录(多个module共享session/module作用域的fixture、互相重叠的分组、独占资源、notconcurrent、cpu密集的case)，
+以--thread=1和--thread=N分别运行多轮，case在fixture中记录开始、结束时间，运行结束后检查：
+    * session、每个module作用域的fixture只执行一次，并且都被卸载
+    * 同一分组内的case按照收集顺序依次运行，前一个case结束后后一个case才开始
+    * 占用独占资源的case互不重叠，notconcurrent的case不与其他case重叠
+    * 全部case都运行并通过
+同时输出--thread=N相对--thread=1的加速比，无GIL时cpu密集的case应当随线程数扩展。
+
+用法(使用free-threaded解释器运行，也可以在普通解释器下运行作为对比)：
+    python3.14t benchmarks/stress_free_threading.py --threads 4 16 --rounds 5 --output result.json
+"""
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from bench_scheduler import copy_plugin, print_failure, run_pytest  # noqa: E402
+
+CONFTEST = '''import json
+import os
+import threading
+import time
+
+import pytest
+
+EVENTS = []
+_lock = threading.Lock()
+
+
+def record(kind, name):
+    with _lock:
+        EVENTS.append([kind, name, time.perf_counter()])
+
+
+@pytest.fixture(scope="session")
+def session_resource():
+    record("setup", "session")
+    yield
+    record("teardown", "session")
+
+
+@pytest.fixture(scope="module")
+def module_resource(request):
+    name = request.module.__name__
+    record("setup", name)
+    yield
+    record("teardown", name)
+
+
+@pytest.fixture(autouse=True)
+def timeline(request, session_resource, module_resource):
+    name = f"{request.module.__name__}::{request.node.name}"
+    record("start", name)
+    yield
+    record("end", name)
+
+
+def pytest_sessionfinish(session):
+    path = os.environ.get("STRESS_EVENTS")
+    if path:
+        with open(path, "w") as f:
+            json.dump(EVENTS, f)
+'''
+
+
+def generate(path, modules, tests, work):
+    """
+    生成合成的测试目录
+
+    :return: dict，case名称 -> {"groups": 分组, "resource": 是否占用独占资源, "notconcurrent": 是否不接受并发}，按照收集顺序排列
+    """
+    os.makedirs(path)
+    manifest = {}
+    for m in range(modules):
+        module = f"test_m{m}"
+        lines = ["import pytest", "", ""]
+        for t in range(tests):
+            name = f"test_{t}"
+            groups = [f"module:{module}"]
+            resource = notconcurrent = False
+            if t % 5 == 0:
+                # 跨module互相重叠的分组，声明分组后不再属于module分组
+                groups = [f"a{(m + t) % 3}", f"b{(m * t) % 4}"]
+                lines.append(f"@pytest.mark.group({', '.join(repr(g) for g in groups)})")
+            if t % 7 == 3:
+                resource = True
+                lines.append("@pytest.mark.resource('db')")
+            if m % 10 == 9 and t == tests - 1:
+                notconcurrent = True
+                lines.append("@pytest.mark.notconcurrent")
+            lines += [f"def {name}():", f"    assert sum(i * i for i in range({work})) >= 0", "", ""]
+            manifest[f"{module}::{name}"] = {"groups": groups, "resource": resource, "notconcurrent": notconcurrent}
+        with open(os.path.join(path, f"{module}.py"), "w") as f:
+            f.write("\n".join(lines))
+    with open(os.path.join(path, "conftest.py"), "w") as f:
+        f.write(CONFTEST)
+    return manifest
+
+
+def check(events, manifest, modules):
+    """
+    检查一次运行记录的事件
+
+    :return: list，违反的约束，为空时说明全部满足
+    """
+    errors = []
+    fixture_counts = {}
+    intervals = {}
+    for kind, name, t in events:
+        if kind in ("setup", "teardown"):
+            fixture_counts[(kind, name)] = fixture_counts.get((kind, name), 0) + 1
+        elif kind == "start":
+            intervals[name] = [t, None]
+        elif name in intervals:
+            intervals[name][1] = t
+
+    for scope in ["session"] + [f"test_m{m}" for m in range(modules)]:
+        for kind in ("setup", "teardown"):
+            count = fixture_counts.get((kind, scope), 0)
+            if count != 1:
+                errors.append(f"{scope}作用域的fixture {kind} {count}次")
+    missing = [name for name in manifest if name not in intervals or intervals[name][1] is None]
+    if missing:
+        errors.append(f"{len(missing)}个case没有完整运行，例如{missing[0]}")
+        return errors
+
+    groups = {}
+    for name, info in manifest.items():
+        for g in info["groups"]:
+            groups.setdefault(g, []).append(name)
+    for g, names in groups.items():
+        for prev, cur in zip(names, names[1:]):
+            if intervals[cur][0] < intervals[prev][1]:
+                errors.append(f"分组{g}中{cur}在{prev}结束前开始")
+
+    def overlapping(names):
+        spans = sorted((intervals[n][0], intervals[n][1], n) for n in names)
+        return [(a[2], b[2]) for a, b in zip(spans, spans[1:]) if b[0] < a[1]]
+
+    for a, b in overlapping([n for n, info in manifest.items() if info["resource"]]):
+        errors.append(f"独占资源db被{a}和{b}同时占用")
+    for name, info in manifest.items():
+        if info["notconcurrent"]:
+            start, end = intervals[name]
+            others = [n for n in manifest if n != name and intervals[n][0] < end and intervals[n][1] > start]
+            if others:
+                errors.append(f"notconcurrent的{name}与{others[0]}同时运行")
+    return errors
+
+
+def gil_enabled():
+    """
+    运行pytest的解释器是否启用了GIL
+    """
+    out = subprocess.run([sys.executable, "-c", "import sys; print(getattr(sys, '_is_gil_enabled', lambda: True)())"],
+                         capture_output=True, text=True)
+    return out.stdout.strip() != "False"
+
+
+def stress(args):
+    results = []
+    with tempfile.TemporaryDirectory(prefix="pytest-groups-stress-") as tmp:
+        copy_plugin(tmp)
+        path = os.path.join(tmp, "stress")
+        manifest = generate(path, args.modules, args.tests, args.work)
+        events_path = os.path.join(tmp, "events.json")
+        os.environ["STRESS_EVENTS"] = events_path
+
+        baseline = None
+        for threads in [1] + [t for t in args.threads if t != 1]:
+            for r in range(args.rounds if threads != 1 else 1):
+                if os.path.exists(events_path):
+                    os.remove(events_path)
+                run_args = [path, f"--thread={threads}"]
+                wall, rss, code, output = run_pytest(tmp, run_args)
+                events = []
+                if os.path.exists(events_path):
+                    with open(events_path) as f:
+                        events = json.load(f)
+                errors = check(events, manifest, args.modules)
+                if code != 0:
+                    print_failure(run_args, code, output)
+                    errors.insert(0, f"pytest返回码{code}")
+                if threads == 1:
+                    baseline = wall
+                result = {
+                    "threads": threads,
+                    "round": r,
+                    "items": len(manifest),
+                    "wall": round(wall, 4),
+                    "speedup": round(baseline / wall, 3) if baseline and wall else None,
+                    "peak_rss_kb": rss,
+                    "errors": errors[:args.max_errors],
+                }
+                results.append(result)
+                print(json.dumps(result, ensure_ascii=False))
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="pytest-groups线程安全压力测试")
+    parser.add_argument("--threads", nargs="+", type=int, default=[4, 16])
+    parser.add_argument("--rounds", type=int, default=3, help="每个线程数运行的轮数")
+    parser.add_argument("--modules", type=int, default=40)
+    parser.add_argument("--tests", type=int, default=20, help="每个module中的case数量")
+    parser.add_argument("--work", type=int, default=200000, help="每个case的cpu计算量(循环次数)")
+    parser.add_argument("--max-errors", type=int, default=20, help="每轮最多输出的错误数量")
+    parser.add_argument("--output", help="结果json文件路径")
+    args = parser.parse_args()
+
+    results = stress(args)
+    data = {
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "gil_enabled": gil_enabled(),
+        "timestamp": time.time(),
+        "args": vars(args),
+        "results": results,
+    }
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(data, f, indent=2, ensure_ascii=False)
+    if any(r["errors"] for r in results):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
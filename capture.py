@@ -0,0 +1,95 @@
+"""
+按线程捕获case的输出
+
+多个线程同时运行case时，pytest全局的输出捕获会把不同case的输出混在一起。这里停用全局捕获，
+将sys.stdout、sys.stderr替换为按线程分发的流，每个线程在运行case的各个阶段时写入自己的缓冲区，
+阶段结束时作为报告的section，与pytest全局捕获时的表现一致。
+
+缓冲区保存在contextvars中：每个线程有自己的上下文，事件循环中的每个协程case也有自己的上下文，
+同一个事件循环线程中交替运行的协程case同样各自捕获输出。
+
+只能捕获通过sys.stdout、sys.stderr的输出，子进程、C扩展直接写文件描述符的输出会直接输出到终端。
+"""
+import contextvars
+import io
+import sys
+
+
+class ThreadLocalStream(object):
+    """
+    当前线程(协程)正在捕获时写入自己的缓冲区，否则写入原来的流
+    """
+
+    def __init__(self, stream):
+        self.stream = stream
+        self.buffer = contextvars.ContextVar(f"pytest_groups_capture_{id(self)}", default=None)
+
+    def write(self, s):
+        buffer = self.buffer.get()
+        if buffer is None:
+            return self.stream.write(s)
+        return buffer.write(s)
+
+    def writelines(self, lines):
+        for line in lines:
+            self.write(line)
+
+    def flush(self):
+        if self.buffer.get() is None:
+            self.stream.flush()
+
+    def start(self):
+        self.buffer.set(io.StringIO())
+
+    def stop(self) -> str:
+        buffer = self.buffer.get()
+        self.buffer.set(None)
+        return buffer.getvalue() if buffer is not None else ""
+
+    def __getattr__(self, name):
+        return getattr(self.stream, name)
+
+
+class ThreadCapture(object):
+    """
+    停用pytest的全局捕获，安装按线程分发的sys.stdout、sys.stderr
+    """
+
+    def __init__(self, config):
+        self.config = config
+        self.capman = config.pluginmanager.getplugin("capturemanager")
+        self.stdout = None
+        self.stderr = None
+
+    def install(self):
+        from _pytest.capture import _get_multicapture
+
+        # 全局捕获替换为不捕获的实现，capturemanager在各阶段读取到的输出为空，不会重复添加section
+        if self.capman is not None:
+            self.capman.stop_global_capturing()
+            self.capman._global_capturing = _get_multicapture("no")
+        self.stdout, self.stderr = ThreadLocalStream(sys.stdout), ThreadLocalStream(sys.stderr)
+        sys.stdout, sys.stderr = self.stdout, self.stderr
+
+    def uninstall(self):
+        sys.stdout, sys.stderr = self.stdout.stream, self.stderr.stream
+        if self.capman is not None:
+            # 恢复为运行case之前挂起的全局捕获
+            self.capman._global_capturing = None
+            self.capman.start_global_capturing()
+            self.capman.suspend_global_capture()
+
+    def start(self):
+        """
+        开始捕获当前线程(协程)的输出
+        """
+        self.stdout.start()
+        self.stderr.start()
+
+    def stop(self):
+        """
+        停止捕获当前线程(协程)的输出
+
+        :return: tuple(stdout, stderr)
+        """
+        return self.stdout.stop(), self.stderr.stop()
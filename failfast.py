@@ -0,0 +1,30 @@
+"""
+分组失败时跳过后续的case
+
+调度进程和worker进程都直接报告跳过的case，不执行setup、call、teardown
+"""
+from _pytest.reports import TestReport
+
+
+def skipped_report(item, reason) -> TestReport:
+    """
+    生成case被跳过的报告，终端输出、junit等插件看到的与@pytest.mark.skip一致
+
+    :param item: 要跳过的case
+    :param reason: 跳过的原因
+    :return:
+    """
+    fspath, lineno, _ = item.location
+    longrepr = (str(fspath), (lineno or 0) + 1, f"Skipped: {reason}")
+    return TestReport(item.nodeid, item.location, {x: 1 for x in item.keywords}, "skipped", longrepr, "setup",
+                      sections=[], duration=0)
+
+
+def report_skipped(item, reason):
+    """
+    不运行case，直接按照skipped报告
+    """
+    ihook = item.ihook
+    ihook.pytest_runtest_logstart(nodeid=item.nodeid, location=item.location)
+    ihook.pytest_runtest_logreport(report=skipped_report(item, reason))
+    ihook.pytest_runtest_logfinish(nodeid=item.nodeid, location=item.location)
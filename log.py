@@ -0,0 +1,138 @@
+"""
+调度日志
+
+日志在调用线程中只是放入队列，由后台线程批量写入文件，避免case运行的线程因为写文件互相阻塞；
+未开启日志时各个方法直接返回，几乎没有开销。
+"""
+import json
+import queue
+import threading
+import time
+import traceback
+
+DEBUG = 10
+INFO = 20
+WARNING = 30
+ERROR = 40
+
+LEVELS = {"debug": DEBUG, "info": INFO, "warning": WARNING, "error": ERROR}
+LEVEL_NAMES = {v: k.upper() for k, v in LEVELS.items()}
+
+# 后台线程每次最多合并写入的日志条数
+BATCH_SIZE = 512
+
+
+class GroupLogger(object):
+    """
+    基于队列、后台线程批量写入的日志
+    """
+
+    def __init__(self):
+        # 未开启日志时level高于所有级别
+        self.level = ERROR + 1
+        self.path = None
+        self.fmt = "text"
+        self.queue = None
+        self.thread = None
+
+    def configure(self, path, level="info", fmt="text"):
+        """
+        开启日志并启动后台写入线程
+
+        :param path: 日志文件路径
+        :param level: 日志级别，debug/info/warning/error
+        :param fmt: 日志格式，text(文本)/json(每行一个json对象)
+        :return:
+        """
+        self.close()
+        self.path = path
+        self.fmt = fmt
+        self.queue = queue.SimpleQueue()
+        self.thread = threading.Thread(target=self._write_loop, name="pytest-groups-log", daemon=True)
+        self.thread.start()
+        self.level = LEVELS[level.lower()]
+
+    def close(self):
+        """
+        写入队列中剩余的日志，并停止后台写入线程
+        """
+        if self.thread is None:
+            return
+        self.level = ERROR + 1
+        self.queue.put(None)
+        self.thread.join()
+        self.thread = None
+        self.queue = None
+
+    def log(self, level, msg, **fields):
+        if level < self.level:
+            return
+        self.queue.put((time.time(), level, threading.current_thread().name, msg, fields))
+
+    def debug(self, msg, **fields):
+        if DEBUG >= self.level:
+            self.log(DEBUG, msg, **fields)
+
+    def info(self, msg, **fields):
+        if INFO >= self.level:
+            self.log(INFO, msg, **fields)
+
+    def warning(self, msg, **fields):
+        if WARNING >= self.level:
+            self.log(WARNING, msg, **fields)
+
+    def error(self, msg, **fields):
+        if ERROR >= self.level:
+            self.log(ERROR, msg, **fields)
+
+    def exception(self, e, **fields):
+        """
+        记录异常和异常堆栈
+        """
+        if ERROR >= self.level:
+            fields["traceback"] = "".join(traceback.format_exception(type(e), e, e.__traceback__))
+            self.log(ERROR, repr(e), **fields)
+
+    def _format(self, record) -> str:
+        t, level, thread, msg, fields = record
+        if self.fmt == "json":
+            data = {"t": round(t, 6), "level": LEVEL_NAMES[level], "thread": thread, "msg": msg}
+            data.update(fields)
+            return json.dumps(data, ensure_ascii=False, default=str)
+
+        line = f"{time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(t))}.{int(t % 1 * 1000):03d} | " \
+               f"{LEVEL_NAMES[level]:<7} | {thread} | {msg}"
+        traceback_text = fields.pop("traceback", None)
+        if fields:
+            line += " | " + " ".join(f"{k}={v}" for k, v in fields.items())
+        if traceback_text:
+            line += "\n" + traceback_text.rstrip("\n")
+        return line
+
+    def _write_loop(self):
+        """
+        后台线程：阻塞等待日志，每次将队列中已有的日志合并为一次写入
+        """
+        q = self.queue
+        with open(self.path, "a", encoding="utf-8") as f:
+            while True:
+                record = q.get()
+                stop = record is None
+                batch = [] if stop else [self._format(record)]
+                while not stop and len(batch) < BATCH_SIZE:
+                    try:
+                        record = q.get_nowait()
+                    except queue.Empty:
+                        break
+                    if record is None:
+                        stop = True
+                    else:
+                        batch.append(self._format(record))
+                if batch:
+                    f.write("\n".join(batch) + "\n")
+                    f.flush()
+                if stop:
+                    return
+
+
+logger = GroupLogger()
@@ -0,0 +1,37 @@
+"""
+调度状态占用内存的统计
+"""
+import sys
+
+
+def deep_sizeof(obj, shared=()) -> int:
+    """
+    计算容器及其包含的元素占用的内存，同一个对象只计算一次
+
+    :param obj: 要统计的对象
+    :param shared: 在调度状态之外共享的对象类型(如pytest的节点)，只计算引用，不计算对象本身
+    :return: 字节数
+    """
+    seen = set()
+    size = 0
+    stack = [obj]
+    while stack:
+        o = stack.pop()
+        if id(o) in seen or isinstance(o, shared):
+            continue
+        seen.add(id(o))
+        size += sys.getsizeof(o)
+        if isinstance(o, dict):
+            stack.extend(o.keys())
+            stack.extend(o.values())
+        elif isinstance(o, (list, tuple, set, frozenset)):
+            stack.extend(o)
+    return size
+
+
+def format_size(size) -> str:
+    for unit in ("B", "KB", "MB"):
+        if size < 1024:
+            return f"{size:.1f}{unit}"
+        size /= 1024
+    return f"{size:.1f}GB"
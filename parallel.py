@@ -0,0 +1,23 @@
+"""
+free-threaded(无GIL)解释器的检测
+
+free-threaded构建的CPython(3.13t/3.14t)中，线程池中的case可以在多个cpu核上真正并行运行，cpu密集的case也能随--thread扩展。
+导入不支持free-threading的C扩展时，解释器会在运行期间重新启用GIL，所以需要在收集完case(扩展模块已经导入)之后再检测。
+"""
+import sys
+import sysconfig
+
+
+def is_free_threaded_build() -> bool:
+    """
+    解释器是否为free-threaded构建
+    """
+    return bool(sysconfig.get_config_var("Py_GIL_DISABLED"))
+
+
+def is_gil_enabled() -> bool:
+    """
+    当前是否启用了GIL，非free-threaded构建总是启用
+    """
+    check = getattr(sys, "_is_gil_enabled", None)
+    return True if check is None else check()
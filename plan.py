@@ -0,0 +1,123 @@
+"""
+分组规划的缓存
+
+case的分组规划(所属分组、notconcurrent、resource、process标记、超时时间)需要对每个case查找marker，case数量很多时收集阶段的耗时明显。
+规划结果按照文件、nodeid缓存在.pytest_cache中，case所在的文件没有变化时直接复用，只重新规划发生变化的文件中的case。
+通过-k、--lf或指定路径只运行部分case时，没有收集到的case的缓存在文件没有变化时保留。
+"""
+import os
+
+# 缓存分组规划的key，位于.pytest_cache中
+PLAN_CACHE_KEY = "pytest-groups/plan"
+
+# 可以直接保存在缓存中的分组key类型
+_PLAIN_TYPES = (str, int, float, bool)
+
+
+def _describe_key(item, key):
+    """
+    将分组key转换为可以保存的描述，自动分组的key为module、class或case对象，保存为相对于case的引用
+
+    :return: list，无法保存时为None
+    """
+    if key is item:
+        return ["item"]
+    if isinstance(key, _PLAIN_TYPES):
+        return ["arg", key]
+    if key is getattr(item, "module", None):
+        return ["module"]
+    if key is getattr(item, "cls", None):
+        return ["class"]
+    return None
+
+
+def _resolve_key(item, description):
+    kind = description[0]
+    if kind == "item":
+        return item
+    if kind == "arg":
+        return description[1]
+    if kind == "module":
+        return item.module
+    return item.cls
+
+
+class GroupPlanCache(object):
+    """
+    按照文件、nodeid缓存case的分组规划，并记录规划时case所在文件的修改时间和大小
+    """
+
+    def __init__(self, cache, fingerprint):
+        """
+        :param cache: pytest的config.cache
+        :param fingerprint: 影响全部case规划的配置，如分组单元、conftest.py的修改时间，变化时缓存全部失效
+        """
+        self.cache = cache
+        self.fingerprint = fingerprint
+        data = cache.get(PLAN_CACHE_KEY, {})
+        if data.get("fingerprint") != fingerprint:
+            data = {}
+        self.cached_files = data.get("files", {})
+        # 文件路径 -> {nodeid: 规划}
+        self.cached_items = data.get("items", {})
+        self.files = {}
+        self.items = {}
+        self.hits = 0
+        self.misses = 0
+
+    def _file_state(self, path):
+        state = self.files.get(path)
+        if state is None:
+            try:
+                st = os.stat(path)
+                state = [st.st_mtime_ns, st.st_size]
+            except OSError:
+                state = []
+            self.files[path] = state
+        return state
+
+    def get(self, item):
+        """
+        读取case的分组规划，case所在的文件发生变化或没有缓存时返回None
+
+        :return: tuple(分组key, 是否notconcurrent, 声明的资源, 是否标注了process, 声明的超时时间)
+        """
+        path = str(item.fspath)
+        entry = self.cached_items.get(path, {}).get(item.nodeid)
+        state = self._file_state(path)
+        if entry is None or not state or self.cached_files.get(path) != state:
+            self.misses += 1
+            return None
+        self.hits += 1
+        self.items.setdefault(path, {})[item.nodeid] = entry
+        keys, notconcurrent, resources, process, timeout = entry
+        return ([_resolve_key(item, key) for key in keys], notconcurrent,
+                tuple(tuple(resource) for resource in resources), process, timeout)
+
+    def put(self, item, plan):
+        """
+        记录case的分组规划，分组key无法保存(例如@pytest.mark.group传入了自定义对象)时不缓存
+        """
+        keys, notconcurrent, resources, process, timeout = plan
+        descriptions = [_describe_key(item, key) for key in keys]
+        if None in descriptions:
+            return
+        path = str(item.fspath)
+        self._file_state(path)
+        self.items.setdefault(path, {})[item.nodeid] = [descriptions, notconcurrent,
+                                                        [list(resource) for resource in resources], process, timeout]
+
+    def save(self):
+        """
+        保存本次收集到的case的规划；本次没有收集到的case(被-k、--lf等过滤，或者不在指定的路径下)，所在文件没有变化时保留原来的规划，
+        文件已经变化或被删除时清除
+        """
+        for path, cached in self.cached_items.items():
+            state = self._file_state(path)
+            if not state or self.cached_files.get(path) != state:
+                continue
+            items = self.items.setdefault(path, {})
+            for nodeid, entry in cached.items():
+                items.setdefault(nodeid, entry)
+        files = {path: self.files[path] for path in self.items}
+        self.cache.set(PLAN_CACHE_KEY, {"fingerprint": self.fingerprint, "files": files, "items": self.items})
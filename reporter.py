@@ -0,0 +1,90 @@
+"""
+统一输出报告的线程
+
+运行case的线程、worker进程的代理线程只把报告相关的hook调用放入有界队列，由一个线程按顺序调用，
+终端输出、junit等插件不会被多个线程同时调用，也不会因为互相争抢终端的写入而拖慢运行case的线程。
+"""
+import queue
+import threading
+
+from .log import logger
+
+
+class OrderedReporter(object):
+    """
+    按照case运行完成的顺序，或者按照分组集中输出报告
+    """
+
+    def __init__(self, order="completion", group_sizes=None, maxsize=1024):
+        """
+        :param order: completion(按照case运行完成的顺序)/group(同一分组的case全部完成后集中输出)
+        :param group_sizes: order为group时，每个分组的case数量，分组id -> 数量
+        :param maxsize: 队列和分组缓冲的最大长度，超过时运行case的线程等待，或者提前输出缓冲最久的分组
+        """
+        self.order = order
+        self.group_sizes = group_sizes or {}
+        self.maxsize = maxsize
+        self.queue = queue.Queue(maxsize)
+        self.thread = None
+        # order为group时，每个分组已经收到的报告
+        self.buffered = {}
+        self.buffered_count = 0
+        self.received = {}
+
+    def start(self):
+        self.thread = threading.Thread(target=self._run, name="pytest-groups-reporter", daemon=True)
+        self.thread.start()
+
+    def put(self, calls, group=None):
+        """
+        放入一个case的全部hook调用，同一个case的报告总是连续输出
+
+        :param calls: list((hook, kwargs))
+        :param group: case所属的分组id，不属于任何分组时为None
+        """
+        self.queue.put((group, calls))
+
+    def close(self):
+        """
+        输出剩余的报告，并等待输出线程结束
+        """
+        if self.thread is None:
+            return
+        self.queue.put(None)
+        self.thread.join()
+        self.thread = None
+
+    def _run(self):
+        while True:
+            entry = self.queue.get()
+            if entry is None:
+                for group in list(self.buffered):
+                    self._emit_group(group)
+                return
+            group, calls = entry
+            if self.order != "group" or group is None:
+                self._emit(calls)
+                continue
+
+            self.buffered.setdefault(group, []).append(calls)
+            self.buffered_count += 1
+            self.received[group] = self.received.get(group, 0) + 1
+            if self.received[group] >= self.group_sizes.get(group, 0):
+                self._emit_group(group)
+            elif self.buffered_count > self.maxsize:
+                # 缓冲的报告过多时，提前输出最早开始缓冲的分组
+                self._emit_group(next(iter(self.buffered)))
+
+    def _emit_group(self, group):
+        entries = self.buffered.pop(group, [])
+        self.buffered_count -= len(entries)
+        for calls in entries:
+            self._emit(calls)
+
+    @staticmethod
+    def _emit(calls):
+        for hook, kwargs in calls:
+            try:
+                hook(**kwargs)
+            except Exception as e:
+                logger.exception(e)
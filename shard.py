@@ -0,0 +1,102 @@
+"""
+将一次收集到的case拆分到多个独立运行的CI任务中
+
+互相重叠的分组(同一个case属于多个分组时，这些分组连通)构成的连通分量必须完整地分配到同一个分片中，分组内case的顺序保证才不会被破坏；
+notconcurrent的case不能与其他case并发，全部分配到同一个分片中。
+连通分量按照历史耗时(没有历史耗时时按照case数量)从大到小依次分配给当前负载最小的分片。
+
+每个分片独立计算分配结果，各个CI任务收集到的case及其顺序、读取的历史耗时必须一致，分配结果才能互补。
+"""
+import pytest
+
+
+def parse_shard(value):
+    """
+    解析--group-shard的取值
+
+    :param value: i/n，i为从1开始的分片序号，n为分片数量
+    :return: tuple(分片下标(从0开始), 分片数量)
+    """
+    value = str(value).strip()
+    try:
+        index, count = (int(v) for v in value.split("/", 1))
+    except ValueError:
+        raise pytest.UsageError(f"--group-shard的取值{value}不合法，格式为i/n") from None
+    if count < 1 or not 1 <= index <= count:
+        raise pytest.UsageError(f"--group-shard的取值{value}不合法，需要满足1 <= i <= n")
+    return index - 1, count
+
+
+def find_components(n, groups, notconcurrent=None) -> list:
+    """
+    计算case所在的连通分量
+
+    :param n: case数量
+    :param groups: 每个分组内的case编号
+    :param notconcurrent: 按照case编号排列的notconcurrent标记，标记的case全部连通
+    :return: list，case编号 -> 连通分量中编号最小的case
+    """
+    parent = list(range(n))
+
+    def find(i):
+        while parent[i] != i:
+            parent[i] = parent[parent[i]]
+            i = parent[i]
+        return i
+
+    def union(a, b):
+        a, b = find(a), find(b)
+        if a != b:
+            # 以编号较小的case作为根，分配结果与分组的遍历顺序无关
+            if a > b:
+                a, b = b, a
+            parent[b] = a
+
+    for members in groups:
+        first = None
+        for i in members:
+            if first is None:
+                first = i
+            else:
+                union(first, i)
+    if notconcurrent:
+        first = None
+        for i in range(n):
+            if notconcurrent[i]:
+                if first is None:
+                    first = i
+                else:
+                    union(first, i)
+    return [find(i) for i in range(n)]
+
+
+def assign_shards(components, weights, count) -> list:
+    """
+    将连通分量分配到分片中，权重大的连通分量优先分配给当前负载最小的分片
+
+    :param components: case编号 -> 连通分量的根
+    :param weights: case编号 -> 权重(历史耗时或1)
+    :param count: 分片数量
+    :return: list，case编号 -> 分片下标
+    """
+    component_weights = {}
+    for i, root in enumerate(components):
+        component_weights[root] = component_weights.get(root, 0.0) + weights[i]
+    loads = [0.0] * count
+    component_shards = {}
+    # 权重相同时按照收集顺序分配，保证各个分片计算出的结果一致
+    for root in sorted(component_weights, key=lambda r: (-component_weights[r], r)):
+        shard = min(range(count), key=lambda s: (loads[s], s))
+        loads[shard] += component_weights[root]
+        component_shards[root] = shard
+    return [component_shards[root] for root in components]
+
+
+def get_item_weights(items, durations=None) -> list:
+    """
+    case的权重：有历史耗时时使用历史耗时，没有历史耗时的case按照已知耗时的平均值估算；完全没有历史耗时时按照case数量均分
+    """
+    if not durations:
+        return [1.0] * len(items)
+    default = sum(durations.values()) / len(durations)
+    return [durations.get(item.nodeid, default) for item in items]
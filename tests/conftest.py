@@ -0,0 +1,42 @@
+"""
+插件的测试在子进程中运行pytest：插件会在sessionstart时替换pytest内部的SetupState、FixtureDef等类，不能在当前进程中运行
+"""
+import glob
+import os
+import shutil
+
+import pytest
+
+pytest_plugins = "pytester"
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+PLUGIN_NAME = "pytest_groups"
+
+
+class GroupsPytester(object):
+    """
+    将插件复制到测试目录中作为pytest_groups包，通过-p pytest_groups加载
+    """
+
+    def __init__(self, pytester):
+        self.pytester = pytester
+        self.path = pytester.path
+        target = self.path / PLUGIN_NAME
+        target.mkdir()
+        for path in glob.glob(os.path.join(ROOT, "*.py")):
+            shutil.copy(path, target)
+
+    def makepyfile(self, *args, **kwargs):
+        return self.pytester.makepyfile(*args, **kwargs)
+
+    def runpytest(self, *args, timeout=60, cache=False):
+        """
+        :param cache: 是否启用.pytest_cache，默认不启用，避免上一次运行的结果影响case的调度顺序
+        """
+        plugins = ("-p", PLUGIN_NAME) if cache else ("-p", PLUGIN_NAME, "-p", "no:cacheprovider")
+        return self.pytester.runpytest_subprocess(*plugins, *args, timeout=timeout)
+
+
+@pytest.fixture
+def groups(pytester) -> GroupsPytester:
+    return GroupsPytester(pytester)
@@ -0,0 +1,149 @@
+ASYNC_TESTS = {
+    "conftest": """
+        import asyncio
+
+        import pytest
+
+
+        @pytest.fixture(scope="module")
+        async def token():
+            await asyncio.sleep(0)
+            return "token"
+    """,
+    "test_async": """
+        import asyncio
+        import os
+        import time
+
+        import pytest
+
+        pytestmark = pytest.mark.group()
+
+
+        def started():
+            with open(os.path.join(os.path.dirname(__file__), "started.log"), "a") as f:
+                f.write(f"{time.monotonic()}\\n")
+
+
+        async def test_1(token):
+            assert token == "token"
+            started()
+            await asyncio.sleep(0.5)
+
+
+        async def test_2(token):
+            assert token == "token"
+            started()
+            await asyncio.sleep(0.5)
+
+
+        async def test_3():
+            started()
+            await asyncio.sleep(0.5)
+
+
+        async def test_fail():
+            await asyncio.sleep(0)
+            assert False
+
+
+        def test_sync():
+            pass
+    """,
+}
+
+
+def test_async_lane_runs_coroutines_concurrently(groups):
+    groups.makepyfile(**ASYNC_TESTS)
+    result = groups.runpytest("--async-concurrency=3")
+    result.assert_outcomes(passed=4, failed=1)
+    result.stdout.fnmatch_lines(["*协程并发数(3)*"])
+    # 三个协程case在同一个事件循环中交替运行，开始时间相差远小于每个case的耗时
+    started = [float(line) for line in (groups.path / "started.log").read_text().split()]
+    assert len(started) == 3
+    assert max(started) - min(started) < 0.4
+
+
+def test_async_lane_with_thread_pool(groups):
+    groups.makepyfile(**ASYNC_TESTS)
+    result = groups.runpytest("--async-concurrency=2", "--thread=2")
+    result.assert_outcomes(passed=4, failed=1)
+
+
+def test_async_lane_function_fixture_per_case(groups):
+    """
+    同时运行的协程case各自setup、teardown function作用域的fixture，不会复用其他case的fixture实例
+    """
+    groups.makepyfile(test_client="""
+        import asyncio
+        import os
+
+        import pytest
+
+
+        def record(line):
+            with open(os.path.join(os.path.dirname(__file__), "events.log"), "a") as f:
+                f.write(line + "\\n")
+
+
+        @pytest.fixture
+        def client():
+            client = object()
+            record(f"setup {id(client)}")
+            yield client
+            record(f"teardown {id(client)}")
+
+
+        async def test_1(client):
+            record(f"use {id(client)}")
+            await asyncio.sleep(0.3)
+
+
+        async def test_2(client):
+            record(f"use {id(client)}")
+            await asyncio.sleep(0.3)
+    """)
+    result = groups.runpytest("--async-concurrency=4", "--group-unit=function")
+    result.assert_outcomes(passed=2)
+    events = [line.split() for line in (groups.path / "events.log").read_text().splitlines()]
+    setups = [i for action, i in events if action == "setup"]
+    assert len(set(setups)) == 2
+    assert sorted(i for action, i in events if action == "use") == sorted(setups)
+    assert sorted(i for action, i in events if action == "teardown") == sorted(setups)
+
+
+def test_async_lane_captures_output_per_case(groups):
+    """
+    同一个事件循环中交替运行的协程case各自捕获输出，报告中只有自己的输出
+    """
+    groups.makepyfile(test_print="""
+        import asyncio
+
+
+        async def test_1():
+            print("output-of-test-1")
+            await asyncio.sleep(0.2)
+            print("output-of-test-1")
+            assert False
+
+
+        async def test_2():
+            print("output-of-test-2")
+            await asyncio.sleep(0.2)
+            print("output-of-test-2")
+            assert False
+    """)
+    result = groups.runpytest("--thread=2", "--async-concurrency=2", "--group-unit=function")
+    result.assert_outcomes(failed=2)
+    # 输出只出现在case各自的Captured stdout call中，没有直接输出到终端
+    captured = {}
+    section = None
+    for line in result.stdout.lines:
+        if line.startswith("___"):
+            section = None
+        elif "Captured stdout call" in line:
+            section = captured.setdefault(len(captured), [])
+        elif line.startswith("output-of-test"):
+            assert section is not None, line
+            section.append(line)
+    assert sorted(captured.values()) == [["output-of-test-1"] * 2, ["output-of-test-2"] * 2]
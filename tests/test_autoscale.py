@@ -0,0 +1,24 @@
+import re
+
+
+def test_thread_pool_grows_for_io_bound_cases(groups):
+    """
+    case大部分时间在等待IO、就绪队列中有积压时，线程池从最小值开始扩容
+    """
+    groups.makepyfile(test_io="""
+        import time
+
+        import pytest
+
+        pytestmark = pytest.mark.group()
+
+
+        @pytest.mark.parametrize("i", range(40))
+        def test_sleep(i):
+            time.sleep(0.1)
+    """)
+    result = groups.runpytest("--thread=1:8")
+    result.assert_outcomes(passed=40)
+    result.stdout.fnmatch_lines(["*pytest-groups thread autoscaling*", "threads: min=1, max=8, final=*"])
+    final = int(re.search(r"threads: min=1, max=8, final=(\d+)", result.stdout.str()).group(1))
+    assert final > 1
@@ -0,0 +1,69 @@
+import pytest
+
+TWO_MODULES = {
+    "test_a": """
+        def test_1():
+            pass
+
+        def test_2():
+            pass
+    """,
+    "test_b": """
+        def test_3():
+            pass
+    """,
+}
+
+
+def test_default_options(groups):
+    """
+    没有任何pytest-groups配置时插件可以正常加载并运行case
+    """
+    groups.makepyfile(**TWO_MODULES)
+    result = groups.runpytest()
+    result.assert_outcomes(passed=3)
+
+
+def test_thread_pool(groups):
+    groups.makepyfile(**TWO_MODULES)
+    result = groups.runpytest("--thread=2")
+    result.assert_outcomes(passed=3)
+    result.stdout.fnmatch_lines(["*pytest-group: 线程数(2*"])
+
+
+def test_options_from_ini(groups):
+    """
+    没有通过命令参数指定时，从配置文件中读取
+    """
+    groups.pytester.makeini("""
+        [pytest]
+        group-lease = 4
+        group-timeout = 30
+        group-report-order = group
+    """)
+    groups.makepyfile(**TWO_MODULES)
+    result = groups.runpytest("--thread=2")
+    result.assert_outcomes(passed=3)
+
+
+def test_remote_workers_require_authkey(groups):
+    groups.makepyfile(**TWO_MODULES)
+    result = groups.runpytest("--group-listen=127.0.0.1:0", "--group-remote-workers=1")
+    assert result.ret != 0
+    result.stderr.fnmatch_lines(["*--group-remote-workers*--group-authkey*"])
+
+
+def test_connect_requires_authkey(groups):
+    groups.makepyfile(**TWO_MODULES)
+    result = groups.runpytest("--group-connect=127.0.0.1:1")
+    assert result.ret != 0
+    result.stderr.fnmatch_lines(["*--group-connect*--group-authkey*"])
+
+
+@pytest.mark.parametrize("value", ["abc", "4:2", "0", "1:x"])
+def test_invalid_thread(groups, value):
+    groups.makepyfile(**TWO_MODULES)
+    result = groups.runpytest(f"--thread={value}")
+    assert result.ret == pytest.ExitCode.USAGE_ERROR
+    result.stderr.fnmatch_lines([f"*--thread的取值{value}不合法*"])
+    assert "INTERNALERROR" not in result.stderr.str() + result.stdout.str()
@@ -0,0 +1,42 @@
+import json
+
+
+def read_plan_cache_log(groups):
+    records = [json.loads(line) for line in (groups.path / "groups.log").read_text().splitlines()]
+    (groups.path / "groups.log").unlink()
+    return [(r["hits"], r["misses"]) for r in records if r["msg"] == "分组规划缓存"]
+
+
+def test_plan_cache_keeps_unselected_cases(groups):
+    """
+    只运行部分case后，其余case的分组规划仍然保留在缓存中
+    """
+    groups.makepyfile(test_a="""
+        def test_1():
+            pass
+
+        def test_2():
+            pass
+
+        def test_3():
+            pass
+    """, test_b="""
+        def test_4():
+            pass
+    """)
+    args = ("--group-plan-cache", "--group-log=groups.log", "--group-log-format=json")
+    result = groups.runpytest(*args, cache=True)
+    result.assert_outcomes(passed=4)
+    assert read_plan_cache_log(groups) == [(0, 4)]
+
+    result = groups.runpytest(*args, "-k", "test_3", cache=True)
+    result.assert_outcomes(passed=1)
+    assert read_plan_cache_log(groups) == [(1, 0)]
+
+    result = groups.runpytest(*args, "test_b.py", cache=True)
+    result.assert_outcomes(passed=1)
+    assert read_plan_cache_log(groups) == [(1, 0)]
+
+    result = groups.runpytest(*args, cache=True)
+    result.assert_outcomes(passed=4)
+    assert read_plan_cache_log(groups) == [(4, 0)]
@@ -0,0 +1,68 @@
+import pytest
+
+MODULE_FIXTURES = {
+    "conftest": """
+        import os
+
+        import pytest
+
+
+        def record(line):
+            with open(os.path.join(os.path.dirname(__file__), "events.log"), "a") as f:
+                f.write(line + "\\n")
+
+
+        @pytest.fixture(scope="module")
+        def module_resource(request):
+            record(f"setup {request.module.__name__}")
+            yield
+            record(f"teardown {request.module.__name__}")
+    """,
+    "test_a": """
+        def test_1(module_resource):
+            pass
+
+        def test_2(module_resource):
+            pass
+    """,
+    "test_b": """
+        def test_3(module_resource):
+            pass
+
+        def test_4(module_resource):
+            pass
+    """,
+}
+
+
+@pytest.mark.parametrize("lease", ["1", "8"])
+def test_worker_switches_modules(groups, lease):
+    """
+    同一个worker进程先后运行不同module的case时，先卸载上一个module的fixture
+    """
+    groups.makepyfile(**MODULE_FIXTURES)
+    result = groups.runpytest("--group-workers=process", "--process=1", f"--group-lease={lease}")
+    result.assert_outcomes(passed=4)
+    events = (groups.path / "events.log").read_text().splitlines()
+    assert events == ["setup test_a", "teardown test_a", "setup test_b", "teardown test_b"]
+
+
+def test_worker_crash_fails_run(groups):
+    """
+    worker进程异常退出时运行失败，而不是一直等待空闲的worker进程
+    """
+    groups.makepyfile(test_crash="""
+        import os
+
+        def test_crash():
+            os._exit(3)
+    """, test_other="""
+        def test_1():
+            pass
+
+        def test_2():
+            pass
+    """)
+    result = groups.runpytest("--group-workers=process", "--process=1", timeout=60)
+    assert result.ret != 0
+    result.stdout.fnmatch_lines(["*FAILED test_crash.py::test_crash*", "*worker进程异常退出*"])
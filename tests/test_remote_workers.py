@@ -0,0 +1,74 @@
+import socket
+import subprocess
+import sys
+import time
+
+from conftest import PLUGIN_NAME
+
+MODULES = {
+    "conftest": """
+        import os
+
+        import pytest
+
+
+        @pytest.fixture(autouse=True)
+        def record(request):
+            with open(os.path.join(os.path.dirname(__file__), "events.log"), "a") as f:
+                f.write(f"{os.getpid()} {request.node.nodeid}\\n")
+    """,
+}
+for name in ("test_a", "test_b", "test_c"):
+    MODULES[name] = "".join(f"""
+        def test_{i}():
+            __import__("time").sleep(0.1)
+    """ for i in range(4))
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def test_remote_workers_on_localhost(groups):
+    """
+    调度进程等待2个通过--group-connect连接的worker进程，全部case按照分组顺序在多个worker进程中运行
+    """
+    groups.makepyfile(**MODULES)
+    address = f"127.0.0.1:{free_port()}"
+    base = [sys.executable, "-m", "pytest", "-p", PLUGIN_NAME, "-p", "no:cacheprovider", "--group-authkey=secret"]
+    coordinator = groups.pytester.popen(
+        [*base, f"--group-listen={address}", "--group-remote-workers=2", "--group-log=groups.log"],
+        stdout=subprocess.PIPE, stderr=subprocess.STDOUT, stdin=subprocess.DEVNULL)
+    workers = []
+    try:
+        # 调度进程开始监听后才启动worker进程
+        log = groups.path / "groups.log"
+        deadline = time.monotonic() + 30
+        while not (log.exists() and "等待其他节点的worker进程连接" in log.read_text()):
+            assert coordinator.poll() is None, coordinator.stdout.read().decode()
+            assert time.monotonic() < deadline
+            time.sleep(0.1)
+        workers = [groups.pytester.popen([*base, f"--group-connect={address}"],
+                                         stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, stdin=subprocess.DEVNULL)
+                   for _ in range(2)]
+        out, _ = coordinator.communicate(timeout=60)
+        for worker in workers:
+            assert worker.wait(timeout=30) == 0
+    finally:
+        for p in [coordinator, *workers]:
+            if p.poll() is None:
+                p.kill()
+    output = out.decode()
+    assert coordinator.returncode == 0, output
+    assert "12 passed" in output
+
+    events = [line.split() for line in (groups.path / "events.log").read_text().splitlines()]
+    assert sorted(nodeid for _, nodeid in events) == sorted(
+        f"{name}.py::test_{i}" for name in ("test_a", "test_b", "test_c") for i in range(4))
+    # 默认按照module分组，每个module中的case按照定义的顺序运行
+    for name in ("test_a", "test_b", "test_c"):
+        assert [nodeid for _, nodeid in events if nodeid.startswith(name)] == [
+            f"{name}.py::test_{i}" for i in range(4)]
+    assert len({pid for pid, _ in events}) > 1
@@ -0,0 +1,115 @@
+import re
+
+import pytest
+
+SLOW_MODULES = {
+    "test_a": """
+        import time
+
+        def test_1():
+            time.sleep(0.2)
+
+        def test_2():
+            time.sleep(0.2)
+    """,
+    "test_b": """
+        import time
+
+        def test_1():
+            time.sleep(0.2)
+
+        def test_2():
+            time.sleep(0.2)
+    """,
+}
+
+VERBOSE_LINE = re.compile(r"^test_[ab]\.py::test_\d PASSED\s+\[\s*\d+%\]$")
+
+
+@pytest.mark.parametrize("args", [
+    ("--thread=2",),
+    ("--group-workers=process", "--process=2"),
+], ids=["thread", "process"])
+def test_verbose_report_lines_not_interleaved(groups, args):
+    """
+    同一个case的报告总是连续输出，-v时每个case的nodeid和结果在同一行
+    """
+    groups.makepyfile(**SLOW_MODULES)
+    result = groups.runpytest("-v", *args)
+    result.assert_outcomes(passed=4)
+    lines = [line for line in result.stdout.lines if line.startswith("test_")]
+    assert len(lines) == 4
+    assert all(VERBOSE_LINE.match(line) for line in lines), lines
+
+
+def test_output_captured_per_thread(groups):
+    """
+    多个线程同时运行case时，每个case的报告中只有自己的输出
+    """
+    groups.makepyfile(test_print="""
+        import time
+
+        import pytest
+
+        pytestmark = pytest.mark.group()
+
+
+        @pytest.mark.parametrize("i", range(4))
+        def test_print(i):
+            print(f"output-of-test-{i}")
+            time.sleep(0.2)
+            print(f"output-of-test-{i}")
+            assert False
+    """)
+    result = groups.runpytest("--thread=4")
+    result.assert_outcomes(failed=4)
+    captured = {}
+    section = None
+    for line in result.stdout.lines:
+        if line.startswith("___"):
+            section = None
+        elif "Captured stdout call" in line:
+            section = captured.setdefault(len(captured), [])
+        elif line.startswith("output-of-test"):
+            assert section is not None, line
+            section.append(line)
+    assert sorted(captured.values()) == [[f"output-of-test-{i}"] * 2 for i in range(4)]
+
+
+@pytest.mark.parametrize("mode", ["hybrid", "async"])
+def test_report_order_group_with_other_lanes(groups, mode):
+    """
+    --group-report-order=group时，分组中有worker进程、事件循环中运行的case，分组全部完成后也立即输出
+    """
+    groups.makepyfile(test_mix="""
+        import pytest
+
+
+        @pytest.mark.process
+        async def test_1():
+            pass
+
+
+        def test_2():
+            pass
+    """, test_other="""
+        import time
+
+
+        def test_3():
+            time.sleep(1)
+
+
+        def test_4():
+            pass
+    """)
+    lane = ("--group-workers=hybrid", "--process=1") if mode == "hybrid" else ("--async-concurrency=2",)
+    result = groups.runpytest("--thread=2", "--group-report-order=group", *lane)
+    if mode == "hybrid":
+        # worker进程中的协程case没有启用事件循环，pytest跳过
+        result.assert_outcomes(passed=3, skipped=1)
+    else:
+        result.assert_outcomes(passed=4)
+    files = [line.split()[0] for line in result.stdout.lines if line.startswith("test_")]
+    # test_mix分组先完成，先于test_other输出，并且每个分组的报告连续输出
+    assert files == ["test_mix.py", "test_other.py"]
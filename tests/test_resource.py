@@ -0,0 +1,86 @@
+RESOURCE_TESTS = """
+    import os
+    import threading
+    import time
+
+    import pytest
+
+    pytestmark = pytest.mark.group()
+
+    lock = threading.Lock()
+    holders = {"db": 0, "cache": 0}
+
+
+    def record(name, limit):
+        with lock:
+            holders[name] += 1
+            current = holders[name]
+        with open(os.path.join(os.path.dirname(__file__), "events.log"), "a") as f:
+            f.write(f"{name} {current} {limit}\\n")
+        time.sleep(0.2)
+        with lock:
+            holders[name] -= 1
+
+
+    @pytest.mark.resource("db")
+    @pytest.mark.parametrize("i", range(4))
+    def test_db(i):
+        record("db", 1)
+
+
+    @pytest.mark.resource("cache", max=2)
+    @pytest.mark.parametrize("i", range(6))
+    def test_cache(i):
+        record("cache", 2)
+"""
+
+
+def test_resource_exclusive(groups):
+    """
+    同时独占资源的case数量不超过声明的max
+    """
+    groups.makepyfile(test_resource=RESOURCE_TESTS)
+    result = groups.runpytest("--thread=8")
+    result.assert_outcomes(passed=10)
+    events = [line.split() for line in (groups.path / "events.log").read_text().splitlines()]
+    assert len(events) == 10
+    assert all(int(current) <= int(limit) for _, current, limit in events)
+    # max=2的资源确实被两个case同时占用
+    assert any(name == "cache" and current == "2" for name, current, _ in events)
+
+
+def test_resource_conflicting_max(groups):
+    """
+    同一个资源声明了不同的max时收集阶段报错，而不是按照各自的max调度
+    """
+    groups.makepyfile(test_conflict="""
+        import pytest
+
+        @pytest.mark.resource("db", max=1)
+        def test_1():
+            pass
+
+        @pytest.mark.resource("db", max=3)
+        def test_2():
+            pass
+
+        @pytest.mark.resource("db", shared=True)
+        def test_3():
+            pass
+    """)
+    result = groups.runpytest("--thread=4")
+    assert result.ret != 0
+    result.stderr.fnmatch_lines(["*test_conflict.py::test_2*max=3*test_conflict.py::test_1*max=1*"])
+
+
+def test_resource_invalid_max(groups):
+    groups.makepyfile(test_invalid="""
+        import pytest
+
+        @pytest.mark.resource("db", max=0)
+        def test_1():
+            pass
+    """)
+    result = groups.runpytest("--thread=4")
+    assert result.ret != 0
+    result.stderr.fnmatch_lines(["*test_invalid.py::test_1*max*"])
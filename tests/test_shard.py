@@ -0,0 +1,92 @@
+import pytest
+
+SHARD_TESTS = {
+    "test_overlap": """
+        import pytest
+
+        @pytest.mark.group("a")
+        def test_1():
+            pass
+
+        @pytest.mark.group("a", "b")
+        def test_2():
+            pass
+
+        @pytest.mark.group("b")
+        def test_3():
+            pass
+
+        @pytest.mark.group("c", "d")
+        def test_4():
+            pass
+
+        @pytest.mark.group("d")
+        def test_5():
+            pass
+    """,
+    "test_serial": """
+        import pytest
+
+        pytestmark = pytest.mark.group()
+
+        @pytest.mark.notconcurrent
+        def test_1():
+            pass
+
+        def test_2():
+            pass
+
+        @pytest.mark.notconcurrent
+        def test_3():
+            pass
+    """,
+}
+for name in ("test_m1", "test_m2", "test_m3"):
+    SHARD_TESTS[name] = """
+        def test_1():
+            pass
+
+        def test_2():
+            pass
+    """
+
+# 必须分配到同一个分片中的case：重叠的分组构成的连通分量、同一个module分组、全部notconcurrent的case
+COMPONENTS = [
+    {"test_overlap.py::test_1", "test_overlap.py::test_2", "test_overlap.py::test_3"},
+    {"test_overlap.py::test_4", "test_overlap.py::test_5"},
+    {"test_serial.py::test_1", "test_serial.py::test_3"},
+    {"test_m1.py::test_1", "test_m1.py::test_2"},
+    {"test_m2.py::test_1", "test_m2.py::test_2"},
+    {"test_m3.py::test_1", "test_m3.py::test_2"},
+]
+
+
+def run_shard(groups, shard):
+    result = groups.runpytest("-v", f"--group-shard={shard}")
+    assert result.ret == 0, result.stdout.str()
+    return {line.split()[0] for line in result.stdout.lines if line.startswith("test_") and " PASSED" in line}
+
+
+def test_shards_disjoint_and_complete(groups):
+    """
+    各分片运行的case互不重叠、合起来覆盖全部case，连通分量完整地属于同一个分片
+    """
+    groups.makepyfile(**SHARD_TESTS)
+    shards = [run_shard(groups, f"{i}/3") for i in range(1, 4)]
+    everything = run_shard(groups, "1/1")
+    assert len(everything) == 14
+    assert sum(len(shard) for shard in shards) == len(everything)
+    assert set().union(*shards) == everything
+    for component in COMPONENTS:
+        assert sum(1 for shard in shards if component & shard) == 1, component
+    # 多个分片都分到了case
+    assert sum(1 for shard in shards if shard) > 1
+
+
+@pytest.mark.parametrize("value", ["4/3", "0/2", "abc", "1/0"])
+def test_invalid_shard(groups, value):
+    groups.makepyfile(**SHARD_TESTS)
+    result = groups.runpytest(f"--group-shard={value}")
+    assert result.ret == pytest.ExitCode.USAGE_ERROR
+    result.stderr.fnmatch_lines([f"*--group-shard的取值{value}不合法*"])
+    assert "INTERNALERROR" not in result.stderr.str() + result.stdout.str()
@@ -0,0 +1,44 @@
+import json
+
+
+def test_trace_fixture_setup_and_teardown(groups):
+    """
+    时间线中记录fixture的执行和卸载，以及case各阶段的运行时间
+    """
+    groups.makepyfile(conftest="""
+        import time
+
+        import pytest
+
+
+        @pytest.fixture(scope="module")
+        def database():
+            time.sleep(0.05)
+            yield
+            time.sleep(0.05)
+
+
+        @pytest.fixture
+        def client(database):
+            yield
+    """, test_a="""
+        def test_1(client):
+            pass
+
+        def test_2(client):
+            pass
+    """)
+    result = groups.runpytest("--thread=2", "--group-trace=trace.json")
+    result.assert_outcomes(passed=2)
+    result.stdout.fnmatch_lines(["*pool utilization*"])
+    events = json.loads((groups.path / "trace.json").read_text())["traceEvents"]
+    spans = [(e["cat"], e["name"]) for e in events if e["ph"] == "X"]
+    assert spans.count(("test", "test_a.py::test_1")) == 1
+    assert spans.count(("call", "test_a.py::test_2")) == 1
+    assert spans.count(("fixture", "database")) == 1
+    assert spans.count(("fixture", "client")) == 2
+    assert spans.count(("fixture-teardown", "database")) == 1
+    assert spans.count(("fixture-teardown", "client")) == 2
+    teardown = next(e for e in events if e.get("cat") == "fixture-teardown" and e["name"] == "database")
+    assert teardown["args"] == {"scope": "module"}
+    assert teardown["dur"] >= 40000
@@ -0,0 +1,43 @@
+import time
+
+import pytest
+
+
+@pytest.mark.parametrize("threads", ["1", "2"])
+def test_timeout_releases_group(groups, threads):
+    """
+    超时的case报告为失败，线程池补充线程后，同一分组中后续的case和notconcurrent的case照常运行
+    """
+    groups.makepyfile(test_hang="""
+        import time
+
+        import pytest
+
+
+        @pytest.mark.group_timeout(0.5)
+        def test_hang():
+            time.sleep(5)
+
+
+        def test_after():
+            pass
+
+
+        @pytest.mark.notconcurrent
+        def test_serial():
+            pass
+    """, test_other="""
+        def test_other():
+            pass
+    """)
+    start = time.monotonic()
+    result = groups.runpytest("-v", f"--thread={threads}")
+    result.assert_outcomes(passed=3, failed=1)
+    # 不等待超时的case所在线程结束
+    assert time.monotonic() - start < 5
+    lines = [line.split()[:2] for line in result.stdout.lines if line.startswith("test_")]
+    assert sorted(lines) == [["test_hang.py::test_after", "PASSED"], ["test_hang.py::test_hang", "FAILED"],
+                             ["test_hang.py::test_serial", "PASSED"], ["test_other.py::test_other", "PASSED"]]
+    # 分组中后续的case在超时的case被放弃后才运行
+    assert lines.index(["test_hang.py::test_after", "PASSED"]) > lines.index(["test_hang.py::test_hang", "FAILED"])
+    result.stdout.fnmatch_lines(["*group-timeout: case运行超过0.5秒*", "*case所在线程的堆栈*", "*time.sleep(5)*"])
@@ -0,0 +1,104 @@
+"""
+调度过程的时间线记录，输出为Chrome trace格式(chrome://tracing、https://ui.perfetto.dev 可直接打开)
+"""
+import json
+import os
+import threading
+import time
+from collections import defaultdict
+
+
+class GroupTracer(object):
+    """
+    记录各线程上的调度、fixture、case运行的时间段，以及线程池空闲时阻塞调度的原因
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.pid = os.getpid()
+        self.lock = threading.Lock()
+        self.events = []
+        self.thread_names = {}
+        self.start = time.perf_counter()
+        self.stop = None
+        # 有空闲线程但没有可运行的任务时，阻塞原因(分组、资源等) -> 阻塞的总时长(秒)
+        self.blocked = defaultdict(float)
+        # 全部case运行(setup+call+teardown)的总时长，用于计算线程池的利用率
+        self.busy = 0.0
+
+    @staticmethod
+    def now():
+        return time.perf_counter()
+
+    def _ts(self, t):
+        return round((t - self.start) * 1e6, 3)
+
+    def complete(self, category, name, start, end=None, **args):
+        """
+        记录一个在当前线程上的时间段
+        """
+        end = self.now() if end is None else end
+        thread = threading.current_thread()
+        event = {"name": name, "cat": category, "ph": "X", "ts": self._ts(start),
+                 "dur": round((end - start) * 1e6, 3), "pid": self.pid, "tid": thread.ident}
+        if args:
+            event["args"] = args
+        with self.lock:
+            self.thread_names.setdefault(thread.ident, thread.name)
+            self.events.append(event)
+            if category == "test":
+                self.busy += end - start
+
+    def instant(self, category, name, **args):
+        """
+        记录一个在当前线程上的时间点
+        """
+        thread = threading.current_thread()
+        event = {"name": name, "cat": category, "ph": "i", "s": "t", "ts": self._ts(self.now()),
+                 "pid": self.pid, "tid": thread.ident}
+        if args:
+            event["args"] = args
+        with self.lock:
+            self.thread_names.setdefault(thread.ident, thread.name)
+            self.events.append(event)
+
+    def scheduler_blocked(self, start, end, reasons):
+        """
+        记录调度线程因为冲突无法调度任务的时间段，时长平均分摊到各个阻塞原因上
+        """
+        if not reasons:
+            return
+        self.complete("blocked", ", ".join(reasons), start, end)
+        with self.lock:
+            for reason in reasons:
+                self.blocked[reason] += (end - start) / len(reasons)
+
+    def summary(self, capacity) -> list:
+        """
+        生成线程池利用率和主要阻塞原因的摘要
+
+        :param capacity: 可同时运行的任务数量
+        :return: 摘要的文本行
+        """
+        wall = (self.stop or self.now()) - self.start
+        lines = [f"wall time: {wall:.3f}s, busy: {self.busy:.3f}s, capacity: {capacity}"]
+        if wall > 0 and capacity:
+            lines.append(f"pool utilization: {self.busy / (wall * capacity):.1%}")
+        top = sorted(self.blocked.items(), key=lambda kv: kv[1], reverse=True)[:10]
+        if top:
+            lines.append("top blocking groups/resources:")
+            lines.extend(f"  {seconds:10.3f}s  {reason}" for reason, seconds in top)
+        lines.append(f"trace: {self.path}")
+        return lines
+
+    def dump(self):
+        """
+        将时间线写入文件
+        """
+        self.stop = self.now()
+        with self.lock:
+            metadata = [{"name": "thread_name", "ph": "M", "pid": self.pid, "tid": tid, "args": {"name": name}}
+                        for tid, name in self.thread_names.items()]
+            data = {"traceEvents": metadata + self.events, "displayTimeUnit": "ms"}
+        with open(self.path, "w", encoding="utf-8") as f:
+            json.dump(data, f, ensure_ascii=False)
@@ -0,0 +1,288 @@
+"""
+多进程、多节点执行模式
+
+调度进程(GroupRunner)负责分组调度，通过WorkerPool将case的nodeid分配给空闲的worker进程；
+worker进程(GroupWorker)使用相同的命令行参数启动pytest并完成收集，按照分配运行case，将报告回传给调度进程，
+由调度进程统一调用报告相关的hook，终端输出、junit等插件与线程模式下的表现一致。
+
+worker进程可以由调度进程在本机启动，也可以在其他节点上通过--group-connect启动后连接到调度进程。
+"""
+import os
+import queue
+import socket
+import subprocess
+import sys
+import threading
+
+import pytest
+
+from .failfast import report_skipped
+from .log import logger
+
+# worker进程通过环境变量得到调度进程的地址和认证密钥
+WORKER_ADDRESS_ENV = "PYTEST_GROUPS_WORKER"
+WORKER_AUTHKEY_ENV = "PYTEST_GROUPS_AUTHKEY"
+
+
+def is_worker():
+    """
+    当前进程是否为被调度进程启动的worker进程
+    """
+    return WORKER_ADDRESS_ENV in os.environ
+
+
+def parse_address(value):
+    """
+    解析host:port格式的地址
+    """
+    host, port = value.rsplit(":", 1)
+    return host, int(port)
+
+
+class WorkerPool(object):
+    """
+    调度进程一侧的worker进程池，每个worker进程同时只运行一个case
+    """
+
+    def __init__(self, config, size, address=("127.0.0.1", 0), authkey=None, remote=0, report_calls=None):
+        """
+        :param config: 配置对象
+        :param size: 在本机启动的worker进程数量
+        :param address: 监听的地址，等待worker进程连接
+        :param authkey: 连接认证的密钥，为None时随机生成，只能用于本机启动的worker进程
+        :param remote: 需要等待连接的其他节点上的worker进程数量
+        :param report_calls: 处理一个case全部报告相关hook调用的方式，入参为(nodeid, list((hook, kwargs)))，
+                             为None时在当前线程中直接调用
+        """
+        # 只有启用worker进程时才需要，插件加载时不导入
+        from concurrent.futures.thread import ThreadPoolExecutor
+        from multiprocessing.connection import Listener
+
+        self.config = config
+        self.report_calls = report_calls or self._call_hooks
+        self.size = size
+        self.remote = remote
+        self.authkey = authkey or os.urandom(16)
+        self.listener = Listener(address, authkey=self.authkey)
+        self.processes = []
+        # 空闲的worker连接
+        self.idle = queue.Queue()
+        self.alive = 0
+        # 每个worker进程对应一个代理线程，负责收发消息
+        self.executor = ThreadPoolExecutor(max_workers=size + remote)
+
+    def start(self):
+        """
+        启动worker进程，并等待全部worker进程连接到调度进程
+        """
+        host, port = self.listener.address
+        if host in ("0.0.0.0", "", "::"):
+            host = "127.0.0.1"
+        env = dict(os.environ)
+        env[WORKER_ADDRESS_ENV] = f"{host}:{port}"
+        env[WORKER_AUTHKEY_ENV] = self.authkey.hex()
+        args = [sys.executable, "-m", "pytest", *self.config.invocation_params.args]
+        for _ in range(self.size):
+            # worker的终端输出没有意义，报告会回传给调度进程输出
+            self.processes.append(subprocess.Popen(args, env=env, cwd=str(self.config.invocation_params.dir),
+                                                   stdout=subprocess.DEVNULL))
+
+        accepted = queue.Queue()
+        total = self.size + self.remote
+
+        def accept():
+            for _ in range(total):
+                accepted.put(self.listener.accept())
+
+        if self.remote:
+            logger.info("等待其他节点的worker进程连接", address=f"{host}:{port}", remote=self.remote)
+        threading.Thread(target=accept, daemon=True).start()
+        for _ in range(total):
+            while True:
+                try:
+                    conn = accepted.get(timeout=1)
+                    break
+                except queue.Empty:
+                    # worker进程在连接前退出，通常是收集阶段出错，不再继续等待
+                    if any(p.poll() is not None for p in self.processes):
+                        self.shutdown()
+                        raise RuntimeError("pytest-groups: worker进程启动失败")
+            _, hostname, pid = conn.recv()
+            logger.info("worker进程已连接", hostname=hostname, pid=pid)
+            self.alive += 1
+            self.idle.put(conn)
+        logger.info("worker进程已全部启动", size=total)
+
+    def acquire(self):
+        """
+        等待一个空闲的worker连接；worker进程全部退出时不再等待
+        """
+        while True:
+            if self.alive <= 0:
+                raise RuntimeError("pytest-groups: 没有可用的worker进程")
+            try:
+                return self.idle.get(timeout=1)
+            except queue.Empty:
+                continue
+
+    def run(self, nodeids, on_done=None):
+        """
+        将一组case分配给一个空闲的worker进程按顺序运行，阻塞直到全部case运行完成，期间收到的报告交给调度进程的hook处理
+
+        :param nodeids: 要运行的case的nodeid
+        :param on_done: 每个case运行完成时的回调，入参为nodeid
+        :return:
+        """
+        conn = self.acquire()
+        nodeid = nodeids[0]
+        # 当前case的报告相关hook调用，收到logfinish后一起交出，同一个case的报告总是连续输出
+        calls = []
+        try:
+            conn.send(("run", nodeids))
+            remaining = len(nodeids)
+            while remaining:
+                message = conn.recv()
+                kind = message[0]
+                if kind == "done":
+                    remaining -= 1
+                    if on_done:
+                        on_done(message[1])
+                    continue
+                elif kind == "logstart":
+                    nodeid = message[1]
+                    calls = [(self.config.hook.pytest_runtest_logstart, {"nodeid": message[1], "location": message[2]})]
+                elif kind == "report":
+                    report = self.config.hook.pytest_report_from_serializable(config=self.config, data=message[1])
+                    calls.append((self.config.hook.pytest_runtest_logreport, {"report": report}))
+                elif kind == "logfinish":
+                    calls.append((self.config.hook.pytest_runtest_logfinish, {"nodeid": message[1], "location": message[2]}))
+                    self.report_calls(message[1], calls)
+                    calls = []
+                elif kind == "error":
+                    raise RuntimeError(message[1])
+        except (EOFError, OSError):
+            # worker进程已经退出，不再归还连接
+            self.alive -= 1
+            conn = None
+            raise RuntimeError(f"pytest-groups: 运行{nodeid}时worker进程异常退出")
+        finally:
+            if conn is not None:
+                self.idle.put(conn)
+
+    @staticmethod
+    def _call_hooks(nodeid, calls):
+        for hook, kwargs in calls:
+            hook(**kwargs)
+
+    def shutdown(self):
+        """
+        通知worker进程卸载全部作用域并退出
+        """
+        # 等待正在运行的case完成，连接全部归还后再通知退出
+        self.executor.shutdown()
+        while True:
+            try:
+                conn = self.idle.get_nowait()
+            except queue.Empty:
+                break
+            try:
+                conn.send(("stop",))
+                conn.close()
+            except OSError:
+                pass
+        for p in self.processes:
+            try:
+                p.wait(timeout=60)
+            except subprocess.TimeoutExpired:
+                p.kill()
+        self.listener.close()
+
+
+class GroupWorker(object):
+    """
+    worker进程一侧的插件，顺序运行调度进程分配的case
+
+    同一个worker进程内的module、session作用域的fixture在case之间保持复用，即每个worker进程只会执行一次session作用域的fixture
+    """
+
+    def __init__(self, config, address=None, authkey=None, failfast=None):
+        """
+        :param config: 配置对象
+        :param address: 调度进程的地址，为None时从环境变量读取(由调度进程在本机启动)
+        :param authkey: 连接认证的密钥
+        :param failfast: --group-failfast的取值，设置时同一批case中有case失败后跳过这一批中剩余的case
+        """
+        self.config = config
+        self.failfast = failfast
+        # 当前这一批case中失败的case
+        self.batch_failed = None
+        if address is None:
+            address = parse_address(os.environ.pop(WORKER_ADDRESS_ENV))
+            authkey = bytes.fromhex(os.environ.pop(WORKER_AUTHKEY_ENV))
+        self.address = address
+        self.authkey = authkey
+        self.conn = None
+
+    @pytest.mark.tryfirst
+    def pytest_runtestloop(self, session):
+        if session.testsfailed and not session.config.option.continue_on_collection_errors:
+            raise session.Interrupted(
+                "%d error%s during collection"
+                % (session.testsfailed, "s" if session.testsfailed != 1 else "")
+            )
+
+        from multiprocessing.connection import Client
+
+        items = {item.nodeid: item for item in session.items}
+        self.conn = Client(self.address, authkey=self.authkey)
+        self.conn.send(("hello", socket.gethostname(), os.getpid()))
+        try:
+            while True:
+                message = self.conn.recv()
+                if message[0] == "stop":
+                    break
+
+                missing = [nodeid for nodeid in message[1] if nodeid not in items]
+                if missing:
+                    self.conn.send(("error", f"pytest-groups: worker进程中没有收集到case：{', '.join(missing)}"))
+                    continue
+
+                batch = [items[nodeid] for nodeid in message[1]]
+                self.batch_failed = None
+                for i, item in enumerate(batch):
+                    if self.batch_failed:
+                        # 同一批case属于同一个分组，前面的case失败后剩余的case不再运行
+                        report_skipped(item, f"group-failfast: {self.batch_failed}失败")
+                        self.conn.send(("done", item.nodeid))
+                        continue
+                    # 同一批case按顺序运行，nextitem为下一个case；最后一个case的nextitem取父节点，只卸载function作用域，
+                    # class/module/session作用域的fixture留给后续case复用，切换到其他module的case时在setup之前卸载
+                    nextitem = batch[i + 1] if i + 1 < len(batch) else item.parent
+                    item.config.hook.pytest_runtest_protocol(item=item, nextitem=nextitem)
+                    self.conn.send(("done", item.nodeid))
+        finally:
+            try:
+                session._setupstate.teardown_all()
+            finally:
+                self.conn.close()
+        return True
+
+    @pytest.mark.tryfirst
+    def pytest_runtest_setup(self, item):
+        """
+        SetupState.prepare只会入栈，不会卸载；上一批case留下的、不在当前case作用域链上的作用域在这里卸载，
+        卸载时的错误作为当前case的setup错误报告
+        """
+        item.session._setupstate._teardown_towards(item.listchain())
+
+    def pytest_runtest_logstart(self, nodeid, location):
+        self.conn.send(("logstart", nodeid, location))
+
+    def pytest_runtest_logfinish(self, nodeid, location):
+        self.conn.send(("logfinish", nodeid, location))
+
+    def pytest_runtest_logreport(self, report):
+        if self.failfast and report.failed and not self.batch_failed:
+            self.batch_failed = report.nodeid
+        data = self.config.hook.pytest_report_to_serializable(config=self.config, report=report)
+        self.conn.send(("report", data))